@@ -0,0 +1,115 @@
+"""
+checks cross-worker notification routing with two real worker processes.
+
+worker A opens a /connection-style session for a user, worker B sends that
+user notifications; the run passes when A's socket receives every one of
+them through the notify:{worker_id} channel. both workers use the redis at
+RealtimeConfig.REDIS_URL unless --redis-url is given.
+
+    python -m benchmarks.cluster_harness
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import uuid
+
+
+class RecordingSocket:
+    """stands in for the websocket, keeps what would have been sent"""
+
+    def __init__(self):
+        self.received = []
+        self.arrived = asyncio.Event()
+
+    async def send_json(self, data):
+        self.received.append(data)
+        self.arrived.set()
+
+
+def make_connection(redis_url: str | None):
+    from r3almX_backend.realtime_service.Config import RealtimeConfig
+
+    if redis_url:
+        RealtimeConfig.REDIS_URL = redis_url
+    from r3almX_backend.realtime_service.connection_service import Connection
+
+    return Connection()
+
+
+def holder(redis_url, user_id, count, ready, results, timeout):
+    async def run():
+        connection = make_connection(redis_url)
+        websocket = RecordingSocket()
+        connection.connection_sockets[user_id] = websocket
+        await connection.connect(user_id)
+        ready.set()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(websocket.received) < count and loop.time() < deadline:
+            websocket.arrived.clear()
+            try:
+                await asyncio.wait_for(
+                    websocket.arrived.wait(), max(0.0, deadline - loop.time())
+                )
+            except asyncio.TimeoutError:
+                break
+        await connection.disconnect(user_id)
+        results.put(("holder", connection.worker_id, websocket.received))
+
+    asyncio.run(run())
+
+
+def sender(redis_url, user_id, count, ready, results, timeout):
+    async def run():
+        connection = make_connection(redis_url)
+        if not await asyncio.to_thread(ready.wait, timeout):
+            results.put(("sender", connection.worker_id, []))
+            return
+        delivered = [
+            await connection.send_notification(user_id, {"seq": seq})
+            for seq in range(count)
+        ]
+        results.put(("sender", connection.worker_id, delivered))
+
+    asyncio.run(run())
+
+
+def main(redis_url: str | None, count: int, timeout: float) -> int:
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    results = ctx.Queue()
+    user_id = str(uuid.uuid4())
+    args = (redis_url, user_id, count, ready, results, timeout)
+    workers = [
+        ctx.Process(target=holder, args=args),
+        ctx.Process(target=sender, args=args),
+    ]
+    for worker in workers:
+        worker.start()
+    reports = dict(
+        (role, (worker_id, data))
+        for role, worker_id, data in (results.get(timeout=timeout * 2) for _ in workers)
+    )
+    for worker in workers:
+        worker.join()
+
+    holder_id, received = reports["holder"]
+    sender_id, delivered = reports["sender"]
+    seqs = [frame["message"]["seq"] for frame in received]
+    print(f"holder {holder_id} received {len(seqs)}/{count}")
+    print(f"sender {sender_id} routed {sum(delivered)}/{count}")
+    ok = holder_id != sender_id and seqs == list(range(count))
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--redis-url")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+    sys.exit(main(args.redis_url, args.count, args.timeout))
@@ -0,0 +1,88 @@
+"""
+in-memory stand-in for the slice of aio_pika the shared room routing uses:
+a connection, channels, a topic exchange with exact routing keys, and
+exclusive queues with one consumer each. deliveries go through an
+asyncio.Queue per queue so publishers never run consumers inline, like a
+real broker.
+"""
+
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Set
+
+_queue_names = itertools.count(1)
+
+
+class MemoryIncomingMessage:
+    def __init__(self, body: bytes, routing_key: str):
+        self.body = body
+        self.routing_key = routing_key
+
+    @asynccontextmanager
+    async def process(self):
+        yield self
+
+
+class MemoryQueue:
+    def __init__(self, name: str | None = None):
+        self.name = name or f"amq.gen-{next(_queue_names)}"
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.consumer_task: asyncio.Task | None = None
+
+    async def consume(self, callback: Callable[[MemoryIncomingMessage], Awaitable]):
+        async def run():
+            while True:
+                message = await self.pending.get()
+                await callback(message)
+
+        self.consumer_task = asyncio.create_task(run())
+        return self.name
+
+    async def bind(self, exchange: "MemoryExchange", routing_key: str):
+        exchange.bindings.setdefault(routing_key, set()).add(self)
+
+    async def unbind(self, exchange: "MemoryExchange", routing_key: str):
+        exchange.bindings.get(routing_key, set()).discard(self)
+
+
+class MemoryExchange:
+    def __init__(self, name: str):
+        self.name = name
+        self.bindings: Dict[str, Set[MemoryQueue]] = {}
+
+    async def publish(self, message, routing_key: str):
+        for queue in tuple(self.bindings.get(routing_key, ())):
+            queue.pending.put_nowait(MemoryIncomingMessage(message.body, routing_key))
+
+
+class MemoryChannel:
+    def __init__(self, broker: "MemoryBroker"):
+        self.broker = broker
+        self.is_closed = False
+
+    async def set_qos(self, prefetch_count: int = 0):
+        pass
+
+    async def declare_exchange(self, name: str, type=None, durable: bool = False):
+        return self.broker.exchanges.setdefault(name, MemoryExchange(name))
+
+    async def declare_queue(self, name: str | None = None, **kwargs) -> MemoryQueue:
+        return MemoryQueue(name)
+
+
+class MemoryConnection:
+    def __init__(self, broker: "MemoryBroker"):
+        self.broker = broker
+        self.is_closed = False
+
+    async def channel(self) -> MemoryChannel:
+        return MemoryChannel(self.broker)
+
+
+class MemoryBroker:
+    def __init__(self):
+        self.exchanges: Dict[str, MemoryExchange] = {}
+
+    def connect(self) -> MemoryConnection:
+        return MemoryConnection(self)
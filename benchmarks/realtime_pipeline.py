@@ -0,0 +1,399 @@
+"""
+end-to-end benchmark of the realtime chat pipeline.
+
+starts the app under uvicorn in this process, with RabbitMQ replaced by an
+in-memory exchange (benchmarks/memory_amqp.py) and Redis by fakeredis, then
+drives ROOMS x CLIENTS websocket clients through /message/{room_id}. every
+client sends MESSAGES messages; each one carries its send time so receivers
+can measure delivery latency.
+
+with --database-url (or DATABASE_URL) set to a local Postgres, users, rooms
+and channels are seeded there and the DigestionBroker writes for real; its
+rows per second are reported. without one the database is left out and the
+broker only buffers.
+
+results are printed as one JSON object on stdout (the app's own prints go to
+stderr), so runs can be diffed between commits:
+
+    python -m benchmarks.realtime_pipeline --rooms 10 --clients 20 > before.json
+
+run it from a directory with the usual .env, the app reads it on import.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchClient:
+    def __init__(self, index: int, room_id: str, token: str):
+        self.index = index
+        self.room_id = room_id
+        self.token = token
+        self.latencies_ns: list = []
+        self.received = 0
+
+    async def receive(self, websocket):
+        async for frame in websocket:
+            payload = json.loads(frame)
+            parts = payload.get("message", "").split("|")
+            if len(parts) == 4 and parts[0] == "bench":
+                self.latencies_ns.append(time.perf_counter_ns() - int(parts[3]))
+                self.received += 1
+
+    async def send(self, websocket, channel_id: str, count: int, interval: float):
+        for seq in range(count):
+            await websocket.send(
+                json.dumps(
+                    {
+                        "message": f"bench|{self.index}|{seq}|{time.perf_counter_ns()}",
+                        "channel_id": channel_id,
+                        # the format the client sends and DigestionBroker parses
+                        "timestamp": datetime.datetime.now().strftime(
+                            "%Y-%m-%d %I:%M:%S %p"
+                        ),
+                    }
+                )
+            )
+            if interval:
+                await asyncio.sleep(interval)
+
+
+async def seed_database(owners, room_ids, snapshots):
+    """users, rooms and one channel per room; returns room_id -> channel_id"""
+    from r3almX_backend.auth_service.user_models import User
+    from r3almX_backend.chat_service.channel_system.channel_utils import (
+        insert_to_channels_table,
+        resolve_channel_model,
+        resolve_message_model,
+    )
+    from r3almX_backend.chat_service.models.rooms_model import (
+        RoomMembersModel,
+        RoomsModel,
+    )
+    from r3almX_backend.database import Base, SessionLocal, engine, init_db
+
+    if not await init_db():
+        raise SystemExit("could not create tables in the benchmark database")
+
+    async with SessionLocal() as db:
+        users = {
+            snapshot["id"]: User(
+                id=uuid.UUID(snapshot["id"]),
+                email=snapshot["email"],
+                username=snapshot["username"],
+                hashed_password="benchmark",
+            )
+            for snapshot in snapshots
+        }
+        db.add_all(users.values())
+        for room_id, owner in zip(room_ids, owners):
+            room = RoomsModel(room_owner=owner, room_name=f"bench-{room_id[:8]}")
+            room.id = uuid.UUID(room_id)
+            db.add(room)
+        await db.flush()
+        db.add_all(
+            RoomMembersModel(
+                room_id=uuid.UUID(s["room_id"]), user_id=uuid.UUID(s["id"])
+            )
+            for s in snapshots
+        )
+        await db.commit()
+
+        channels = {}
+        for room_id, owner in zip(room_ids, owners):
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    Base.metadata.create_all,
+                    tables=[
+                        resolve_channel_model(room_id).__table__,
+                        resolve_message_model(room_id).__table__,
+                    ],
+                )
+            channels[room_id] = str(
+                await insert_to_channels_table(
+                    room_id, db, users[owner], "bench", "benchmark channel"
+                )
+            )
+        return channels
+
+
+async def run(args) -> dict:
+    import fakeredis
+    import uvicorn
+    import websockets
+
+    from benchmarks.memory_amqp import MemoryBroker
+    from r3almX_backend import r3almX
+    from r3almX_backend.auth_service.auth_utils import create_access_token
+    from r3almX_backend.auth_service.user_cache import user_cache
+    from r3almX_backend.chat_service.room_service.room_list_cache import (
+        room_member_cache,
+    )
+    from r3almX_backend.realtime_service import message_bus
+    from r3almX_backend.realtime_service.chat_service import (
+        digestion_broker,
+        flush_scheduler_task,
+        room_manager,
+    )
+    from r3almX_backend.realtime_service.connection_service import connection_manager
+    from r3almX_backend.realtime_service.message_spool import MessageSpool
+    from r3almX_backend.realtime_service.metrics import (
+        digest_batch_size,
+        digest_failed,
+        digest_flush_seconds,
+    )
+
+    use_db = bool(args.database_url)
+
+    # stand-ins for the broker and redis, the code under test is unchanged
+    message_bus.rabbit_connection = MemoryBroker().connect()
+    redis_server = fakeredis.FakeServer()
+    room_manager.bus = message_bus.create_message_bus(room_manager.dispatch, args.bus)
+    for owner in (
+        room_manager.message_cache,
+        connection_manager,
+        user_cache,
+        room_member_cache,
+        room_manager.bus,
+    ):
+        owner.redis_client = fakeredis.FakeAsyncRedis(
+            server=redis_server, decode_responses=True
+        )
+    spool_dir = tempfile.TemporaryDirectory(prefix="r3almx-bench-spool-")
+    digestion_broker.spool = None if args.no_spool else MessageSpool(spool_dir.name)
+    if args.batch_size:
+        digestion_broker.batch_size = args.batch_size
+    # the run starts its own scheduler when there is a database to flush into
+    flush_scheduler_task.cancel()
+    if not use_db:
+        # nothing to flush into, keep the batch in memory for the whole run
+        digestion_broker.batch_size = float("inf")
+
+    room_ids = [str(uuid.uuid4()) for _ in range(args.rooms)]
+    snapshots = []
+    for room_id in room_ids:
+        for _ in range(args.clients):
+            user_id = str(uuid.uuid4())
+            snapshots.append(
+                {
+                    "id": user_id,
+                    "email": f"{user_id}@bench.local",
+                    "username": f"bench-{user_id[:8]}",
+                    "google_id": None,
+                    "profile_pic": None,
+                    "is_active": True,
+                    "room_id": room_id,
+                }
+            )
+    owners = [snapshots[i * args.clients]["id"] for i in range(args.rooms)]
+
+    if use_db:
+        channels = await seed_database(owners, room_ids, snapshots)
+    else:
+        channels = {room_id: str(uuid.uuid4()) for room_id in room_ids}
+        # no users table to read from, serve every lookup from the cache
+        for snapshot in snapshots:
+            await user_cache.put(snapshot)
+        # nor a room_members table, room notifications load the seeded rooms
+        members = {room_id: [] for room_id in room_ids}
+        for snapshot in snapshots:
+            members[snapshot["room_id"]].append(snapshot["id"])
+
+        async def load_members(db, room_id):
+            return members.get(str(room_id), [])
+
+        room_member_cache.load = load_members
+
+    server = uvicorn.Server(
+        uvicorn.Config(
+            r3almX,
+            host="127.0.0.1",
+            port=args.port,
+            lifespan="off",
+            log_level="warning",
+            ws_max_queue=1024,
+        )
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    flush_task = (
+        asyncio.create_task(digestion_broker.start_flush_scheduler())
+        if use_db
+        else None
+    )
+
+    clients = [
+        BenchClient(
+            index,
+            snapshot["room_id"],
+            create_access_token({"sub": snapshot["email"]})[0],
+        )
+        for index, snapshot in enumerate(snapshots)
+    ]
+    sockets = [
+        await websockets.connect(
+            f"ws://127.0.0.1:{args.port}/message/{client.room_id}?token={client.token}",
+            max_queue=None,
+        )
+        for client in clients
+    ]
+    receivers = [
+        asyncio.create_task(client.receive(websocket))
+        for client, websocket in zip(clients, sockets)
+    ]
+    # room bindings are made after accept, give the last ones a moment
+    await asyncio.sleep(args.settle)
+
+    interval = 1 / args.rate if args.rate else 0
+    expected = args.rooms * args.clients * args.messages * args.clients
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client.send(websocket, channels[client.room_id], args.messages, interval)
+            for client, websocket in zip(clients, sockets)
+        )
+    )
+    sent_elapsed = time.perf_counter() - started
+
+    deadline = time.perf_counter() + args.timeout
+    while (
+        sum(client.received for client in clients) < expected
+        and time.perf_counter() < deadline
+    ):
+        await asyncio.sleep(0.01)
+    delivered_elapsed = time.perf_counter() - started
+
+    db_result = None
+    if use_db:
+        flush_started = time.perf_counter()
+        while digestion_broker.message_batch or (
+            digestion_broker.flush_task and not digestion_broker.flush_task.done()
+        ):
+            if digestion_broker.flush_task and not digestion_broker.flush_task.done():
+                await digestion_broker.flush_task
+            else:
+                await digestion_broker.flush_to_db()
+        rows = digest_batch_size.sum - digest_failed.value
+        db_result = {
+            "rows": int(rows),
+            "flushes": digest_batch_size.count,
+            "flush_seconds": round(digest_flush_seconds.sum, 4),
+            "rows_per_s": (
+                round(rows / digest_flush_seconds.sum, 1)
+                if digest_flush_seconds.sum
+                else None
+            ),
+            "rows_per_s_wall": round(
+                rows / (delivered_elapsed + time.perf_counter() - flush_started), 1
+            ),
+            "failed": int(digest_failed.value),
+        }
+        flush_task.cancel()
+
+    for task in receivers:
+        task.cancel()
+    for websocket in sockets:
+        await websocket.close()
+    server.should_exit = True
+    await server_task
+    spool_dir.cleanup()
+
+    latencies = sorted(
+        latency / 1e6 for client in clients for latency in client.latencies_ns
+    )
+    received = len(latencies)
+    sent = args.rooms * args.clients * args.messages
+    return {
+        "commit": git_commit(),
+        "config": {
+            "rooms": args.rooms,
+            "clients_per_room": args.clients,
+            "messages_per_client": args.messages,
+            "rate_per_client": args.rate,
+            "bus": args.bus,
+            "database": use_db,
+            "spool": not args.no_spool,
+            "batch_size": digestion_broker.batch_size if use_db else None,
+        },
+        "delivery": {
+            "sent": sent,
+            "expected": expected,
+            "received": received,
+            "p50_ms": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "p90_ms": round(percentile(latencies, 0.90), 3) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 3) if latencies else None,
+            "max_ms": round(latencies[-1], 3) if latencies else None,
+        },
+        "throughput": {
+            "send_seconds": round(sent_elapsed, 4),
+            "messages_per_s": round(sent / sent_elapsed, 1) if sent_elapsed else None,
+            "deliveries_per_s": round(received / delivered_elapsed, 1),
+        },
+        "db": db_result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=10, help="clients per room")
+    parser.add_argument("--messages", type=int, default=20, help="per client")
+    parser.add_argument(
+        "--rate", type=float, default=0, help="messages/s per client, 0 = unpaced"
+    )
+    parser.add_argument(
+        "--bus",
+        # message_bus.BUS_BACKENDS, not imported before DATABASE_URL is set
+        choices=("inprocess", "rabbitmq", "redis"),
+        default="rabbitmq",
+        help="message bus backend for RoomManager",
+    )
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--batch-size", type=int, help="DigestionBroker batch size")
+    parser.add_argument("--no-spool", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    if args.database_url:
+        # read by r3almX_backend.database when the app is imported
+        os.environ["DATABASE_URL"] = args.database_url
+
+    with contextlib.redirect_stdout(sys.stderr):
+        result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
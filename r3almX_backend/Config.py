@@ -0,0 +1,19 @@
+# Constants for the app itself, overridable through the .env file.
+from typing import Final
+
+from dotenv import dotenv_values
+
+
+class AppConfig(object):
+    config = dotenv_values(".env")
+    # "json": one JSON object per request, "rich": pretty console tables for
+    # local development, "off": no access log
+    ACCESS_LOG_MODE: Final = config.get("ACCESS_LOG_MODE", "json")
+    # fraction of requests logged, responses at or above ACCESS_LOG_ALWAYS_STATUS
+    # are always logged. sampled by default, 1.0 logs every request
+    ACCESS_LOG_SAMPLE_RATE: Final = float(config.get("ACCESS_LOG_SAMPLE_RATE", 0.01))
+    ACCESS_LOG_ALWAYS_STATUS: Final = int(config.get("ACCESS_LOG_ALWAYS_STATUS", 500))
+    # file to append to, empty string writes to stdout
+    ACCESS_LOG_FILE: Final = config.get("ACCESS_LOG_FILE", "")
+    # entries waiting for the writer thread, newer ones are dropped past this
+    ACCESS_LOG_QUEUE_SIZE: Final = int(config.get("ACCESS_LOG_QUEUE_SIZE", 10000))
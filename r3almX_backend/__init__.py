@@ -7,6 +7,7 @@ from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from r3almX_backend.database import init_db
+from r3almX_backend.proj_logger import AccessLogMiddleware, access_log
 
 from .version import __version__
 
@@ -43,6 +44,10 @@ class RealmX(FastAPI):
         )
         self.add_middleware(GZipMiddleware)
         self.add_middleware(SessionMiddleware, secret_key="aloweuifhlaiuwegfliauwegbf")
+        # outermost, so the logged time covers every other middleware
+        self.add_middleware(AccessLogMiddleware, access_log=access_log)
+        self.on_event("startup")(access_log.start)
+        self.on_event("shutdown")(access_log.stop)
 
     def add_routes(self):
         from r3almX_backend.auth_service.main import auth_router
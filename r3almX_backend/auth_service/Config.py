@@ -15,3 +15,9 @@ class UsersConfig(object):
     GOOGLE_CLIENT_ID = config["GOOGLE_CLIENT_ID"]
     GOOGLE_CLIENT_SECRET = config["GOOGLE_CLIENT_SECRET"]
     GOOGLE_REDIRECT_URI = config["GOOGLE_REDIRECT_URI"]
+    # user lookups: short in-process ttl (other workers may be stale for this
+    # long after a change), longer shared ttl in redis
+    USER_CACHE_LOCAL_TTL: Final = float(config.get("USER_CACHE_LOCAL_TTL", 5))
+    USER_CACHE_REDIS_TTL: Final = int(config.get("USER_CACHE_REDIS_TTL", 300))
+    USER_CACHE_SIZE: Final = int(config.get("USER_CACHE_SIZE", 10000))
+    REDIS_URL: Final = config.get("REDIS_URL", "redis://redis:6379")
@@ -5,9 +5,11 @@ from fastapi import Body, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from google.auth.transport import requests as google_requests
 from google.oauth2 import id_token as google_id_token
-from jose import JWTError, jwt
+from jose import JWTError
 
 from r3almX_backend.auth_service.Config import UsersConfig
+from r3almX_backend.auth_service.token_auth import token_authenticator
+from r3almX_backend.auth_service.user_cache import invalidate_user
 from r3almX_backend.auth_service.user_handler_utils import (
     create_auth_data,
     create_user_record,
@@ -17,6 +19,7 @@ from r3almX_backend.auth_service.user_handler_utils import (
     verify_password,
 )
 from r3almX_backend.auth_service.user_schemas import UserCreate
+from r3almX_backend.search_service.prefix_index import username_index
 
 from .auth_utils import create_access_token, get_current_user
 from .main import auth_router
@@ -154,16 +157,14 @@ async def assign_username(
     token: str = Depends(get_token_from_header),
     db=Depends(get_db),
 ):
-    payload = jwt.decode(
-        token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
-    )
-    email: str = payload.get("sub")
-    if email is None:
+    user_inst = await token_authenticator.authenticate(token, db)
+    if user_inst is None:
         return HTTPException(404, "email was null")
-    user_inst = await get_user_by_email(db, email)
     user_inst.username = str(username)
 
     await db.commit()
+    await invalidate_user(user_inst.id, user_inst.email)
+    await username_index.publish(user_inst)
 
     return {
         "status_code": 200,
@@ -174,14 +175,8 @@ async def assign_username(
 @auth_router.get("/fetch", tags=["Auth"])
 async def verify_token(token: str = Depends(get_token_from_header), db=Depends(get_db)):
     try:
-        decoded_token = jwt.decode(
-            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
-        )
-
-        email = decoded_token.get("sub")
-        if not isinstance(email, str):
-            raise HTTPException(status_code=400, detail="Invalid token payload")
-        user = await get_user_by_email(db, email)
+        # one decode at most: None covers a missing sub as well as no user
+        user = await token_authenticator.authenticate(token, db)
         if user:
             return {
                 "status_code": 200,
@@ -202,7 +197,7 @@ async def verify_user_token(
     username: str, token: str = Depends(get_token_from_header), db=Depends(get_db)
 ):
     try:
-        jwt.decode(token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM])
+        token_authenticator.decode(token)
 
         user = await get_user_by_username(db, username)
         if user:
@@ -233,11 +228,7 @@ async def token_verify(token: str = Depends(get_token_from_header), db=Depends(g
     if token == "null" or token is None:
         return {"status_code": 401, "is_user_logged_in": False}
     try:
-        decoded_token = jwt.decode(
-            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
-        )
-
-        user = await get_user_by_email(db, str(decoded_token.get("sub")))
+        user = await token_authenticator.authenticate(token, db)
         if user:
             return {
                 "status_code": 200,
@@ -15,6 +15,7 @@ from r3almX_backend.auth_service.user_handler_utils import (
     get_user_by_email,
     verify_password,
 )
+from r3almX_backend.auth_service.token_auth import token_authenticator
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
@@ -81,18 +82,10 @@ async def get_current_user(
             print(f"Invalid token format: {token}")
             raise credentials_exception
 
-        payload = jwt.decode(
-            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            print("exception as called here: LINE 90", e)
-            raise credentials_exception
-        token_data = TokenData(email=email)
+        user = await token_authenticator.authenticate(token, db)
     except JWTError as e:
         print("exception as called here: LINE 94", e)
         raise credentials_exception from e
-    user = await get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,153 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from r3almX_backend.auth_service.Config import UsersConfig
+from r3almX_backend.auth_service.user_cache import (
+    attach_user,
+    load_user,
+    snapshot_user,
+    user_cache,
+)
+from r3almX_backend.auth_service.user_models import User
+
+
+class TokenEntry:
+    __slots__ = ("claims", "expires_at", "snapshot")
+
+    def __init__(self, claims: Dict[str, Any], expires_at: float, snapshot: dict):
+        self.claims = claims
+        self.expires_at = expires_at
+        self.snapshot = snapshot
+
+
+class TokenAuthenticator:
+    """
+    decode-once verification for bearer tokens.
+
+    a verified token is remembered by its sha256 together with its claims
+    and a snapshot of the user it belongs to, for at most local_ttl seconds
+    and never past the token's own exp. repeat requests with the same token
+    skip both jwt.decode and the user lookup. entries for a user are dropped
+    when the user cache invalidates that user on this worker, and the ttl
+    bounds how long a change made on another worker can go unseen.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = UsersConfig.USER_CACHE_SIZE,
+        local_ttl: float = UsersConfig.USER_CACHE_LOCAL_TTL,
+    ):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.entries: "OrderedDict[bytes, TokenEntry]" = OrderedDict()
+        self.by_email: Dict[str, Set[bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def token_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def lookup(self, key: bytes) -> TokenEntry | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self.drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def drop(self, key: bytes):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.by_email.get(entry.snapshot["email"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_email[entry.snapshot["email"]]
+
+    def store(self, key: bytes, claims: Dict[str, Any], snapshot: dict):
+        # the snapshot is only as fresh as the local ttl allows, and tokens
+        # are always issued with exp, without one the ttl alone applies
+        expires_at = time.time() + self.local_ttl
+        if claims.get("exp"):
+            expires_at = min(float(claims["exp"]), expires_at)
+        self.entries[key] = TokenEntry(claims, expires_at, snapshot)
+        self.by_email.setdefault(snapshot["email"], set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self.drop(next(iter(self.entries)))
+
+    def forget_user(self, user_id: str | None, email: str | None):
+        if email is None and user_id is not None:
+            email = next(
+                (
+                    entry.snapshot["email"]
+                    for entry in self.entries.values()
+                    if entry.snapshot["id"] == user_id
+                ),
+                None,
+            )
+        for key in list(self.by_email.get(email, ())):
+            self.drop(key)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """verified claims of a token, raises JWTError when it is not valid"""
+        entry = self.lookup(self.token_key(token))
+        if entry is not None:
+            self.hits += 1
+            return entry.claims
+        self.misses += 1
+        return jwt.decode(
+            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
+        )
+
+    async def authenticate(self, token: str, db: AsyncSession) -> User | None:
+        """the user a token belongs to, bound to db; raises JWTError"""
+        key = self.token_key(token)
+        entry = self.lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return await attach_user(db, entry.snapshot)
+
+        self.misses += 1
+        claims = jwt.decode(
+            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
+        )
+        email = claims.get("sub")
+        if not isinstance(email, str):
+            return None
+
+        snapshot = await user_cache.get(f"email:{email}")
+        if snapshot is not None:
+            user = await attach_user(db, snapshot)
+        else:
+            user = await load_user(db, User.email == email)
+            if user is None:
+                return None
+            snapshot = snapshot_user(user)
+            await user_cache.put(snapshot)
+        self.store(key, claims, snapshot)
+        return user
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+token_authenticator = TokenAuthenticator()
+user_cache.on_invalidate(token_authenticator.forget_user)
+
+
+async def get_user_from_token(token: str, db: AsyncSession) -> User | None:
+    """websocket/header auth helper, None when the token is not usable"""
+    try:
+        return await token_authenticator.authenticate(token, db)
+    except JWTError as j:
+        print(f"token rejected: {j}")
+        return None
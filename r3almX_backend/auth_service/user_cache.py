@@ -0,0 +1,189 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from r3almX_backend.auth_service.Config import UsersConfig
+from r3almX_backend.auth_service.user_models import User
+
+
+def snapshot_user(user: User) -> Dict[str, Any]:
+    # hashed_password deliberately stays out of the cache
+    return {
+        "id": str(user.id),
+        "email": user.email,
+        "username": user.username,
+        "google_id": user.google_id,
+        "profile_pic": user.profile_pic,
+        "is_active": user.is_active,
+    }
+
+
+class UserCache:
+    """
+    two-tier user lookup cache keyed by id and by email.
+
+    the in-process tier is a small TTL/LRU map so hot paths (token auth,
+    the websocket send loop) skip the network entirely; the redis tier is
+    shared by every worker. entries are plain snapshots, never ORM objects,
+    and are dropped by invalidate() whenever a user row changes.
+    """
+
+    def __init__(
+        self,
+        local_ttl: float = UsersConfig.USER_CACHE_LOCAL_TTL,
+        redis_ttl: int = UsersConfig.USER_CACHE_REDIS_TTL,
+        maxsize: int = UsersConfig.USER_CACHE_SIZE,
+    ):
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.maxsize = maxsize
+        self.local: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.redis_client = redis.Redis().from_url(
+            url=UsersConfig.REDIS_URL, decode_responses=True, db=1
+        )
+        self.listeners: List[Callable[[str | None, str | None], None]] = []
+
+    def on_invalidate(self, listener: Callable[[str | None, str | None], None]):
+        """listener(user_id, email) runs whenever a user is invalidated"""
+        self.listeners.append(listener)
+
+    def get_local(self, key: str) -> Dict[str, Any] | None:
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self.local[key]
+            return None
+        self.local.move_to_end(key)
+        return snapshot
+
+    def put_local(self, snapshot: Dict[str, Any]):
+        expires_at = time.monotonic() + self.local_ttl
+        for key in (f"id:{snapshot['id']}", f"email:{snapshot['email']}"):
+            self.local[key] = (expires_at, snapshot)
+            self.local.move_to_end(key)
+        while len(self.local) > self.maxsize:
+            self.local.popitem(last=False)
+
+    async def get(self, key: str) -> Dict[str, Any] | None:
+        snapshot = self.get_local(key)
+        if snapshot is not None:
+            return snapshot
+        try:
+            cached = await self.redis_client.get(f"user:{key}")
+        except Exception as e:
+            print(f"user cache read failed: {e}")
+            return None
+        if cached is None:
+            return None
+        snapshot = json.loads(cached)
+        self.put_local(snapshot)
+        return snapshot
+
+    async def put(self, snapshot: Dict[str, Any]):
+        self.put_local(snapshot)
+        encoded = json.dumps(snapshot)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(f"user:id:{snapshot['id']}", encoded, ex=self.redis_ttl)
+                pipe.set(f"user:email:{snapshot['email']}", encoded, ex=self.redis_ttl)
+                await pipe.execute()
+        except Exception as e:
+            print(f"user cache write failed: {e}")
+
+    async def invalidate(self, user_id: str | None = None, email: str | None = None):
+        # drop both keys even when only one is known
+        snapshot = None
+        if user_id is not None:
+            snapshot = self.get_local(f"id:{user_id}")
+        elif email is not None:
+            snapshot = self.get_local(f"email:{email}")
+        if snapshot is not None:
+            user_id = user_id or snapshot["id"]
+            email = email or snapshot["email"]
+
+        keys = []
+        if user_id is not None:
+            keys.append(f"id:{user_id}")
+        if email is not None:
+            keys.append(f"email:{email}")
+        for key in keys:
+            self.local.pop(key, None)
+        try:
+            if keys:
+                await self.redis_client.delete(*(f"user:{key}" for key in keys))
+        except Exception as e:
+            print(f"user cache invalidation failed: {e}")
+
+        for listener in self.listeners:
+            listener(str(user_id) if user_id else None, email)
+
+
+user_cache = UserCache()
+
+
+async def attach_user(db: AsyncSession, snapshot: Dict[str, Any]) -> User:
+    """
+    turn a snapshot back into a User bound to db without a SELECT, so
+    callers can keep mutating and committing it like a loaded row
+    """
+    user = User(
+        id=uuid.UUID(snapshot["id"]),
+        email=snapshot["email"],
+        username=snapshot["username"],
+        google_id=snapshot["google_id"],
+        profile_pic=snapshot["profile_pic"],
+        is_active=snapshot["is_active"],
+    )
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+async def load_user(db: AsyncSession, *criteria) -> User | None:
+    result = await db.execute(select(User).filter(*criteria))
+    return result.scalars().first()
+
+
+async def get_user_snapshot(db: AsyncSession, user_id: str) -> Dict[str, Any] | None:
+    snapshot = await user_cache.get(f"id:{user_id}")
+    if snapshot is None:
+        user = await load_user(db, User.id == str(user_id))
+        if user is None:
+            return None
+        snapshot = snapshot_user(user)
+        await user_cache.put(snapshot)
+    return snapshot
+
+
+async def get_cached_user(db: AsyncSession, user_id: str) -> User | None:
+    snapshot = await user_cache.get(f"id:{user_id}")
+    if snapshot is None:
+        user = await load_user(db, User.id == str(user_id))
+        if user is not None:
+            await user_cache.put(snapshot_user(user))
+        return user
+    return await attach_user(db, snapshot)
+
+
+async def get_cached_user_by_email(db: AsyncSession, email: str) -> User | None:
+    snapshot = await user_cache.get(f"email:{email}")
+    if snapshot is None:
+        user = await load_user(db, User.email == email)
+        if user is not None:
+            await user_cache.put(snapshot_user(user))
+        return user
+    return await attach_user(db, snapshot)
+
+
+async def invalidate_user(user_id: str | None = None, email: str | None = None):
+    await user_cache.invalidate(
+        str(user_id) if user_id is not None else None, email
+    )
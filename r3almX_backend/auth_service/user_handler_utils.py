@@ -6,9 +6,11 @@ from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from r3almX_backend.auth_service.user_cache import invalidate_user
 from r3almX_backend.auth_service.user_models import AuthData, User
 from r3almX_backend.auth_service.user_schemas import UserCreate
 from r3almX_backend.database import SessionLocal
+from r3almX_backend.search_service.prefix_index import username_index
 
 password_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
@@ -18,6 +20,17 @@ async def get_user(db: AsyncSession, user_id: str):
     return result.scalars().first()
 
 
+async def get_usernames(db: AsyncSession, user_ids) -> dict[str, str]:
+    """resolve many user ids to usernames in a single query"""
+    user_ids = {str(user_id) for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+    result = await db.execute(
+        select(User.id, User.username).filter(User.id.in_(user_ids))
+    )
+    return {str(user_id): username for user_id, username in result.all()}
+
+
 async def get_user_by_username(db: AsyncSession, username: str) -> User:
     result = await db.execute(select(User).filter(User.username == username))
     return result.scalars().first()
@@ -72,6 +85,8 @@ async def create_user_record(db: AsyncSession, user: UserCreate):
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
+    await invalidate_user(db_user.id, db_user.email)
+    await username_index.publish(db_user)
 
     return db_user
 
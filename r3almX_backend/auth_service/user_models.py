@@ -1,18 +1,32 @@
 import uuid
 from typing import Never
 
-from sqlalchemy import Boolean, Column, ForeignKey, Index, String, cast, func, literal
-from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG, TEXT, UUID
+from sqlalchemy import (
+    Boolean,
+    Column,
+    ForeignKey,
+    Index,
+    String,
+    cast,
+    func,
+    literal_column,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, TEXT, UUID
 from sqlalchemy.orm import relationship
 
 from r3almX_backend.database import Base
 
 
+# inline constants, not bound parameters: a query only uses idx_person_fts when
+# its expression is the index expression, constants included
+ENGLISH = literal_column("'english'::regconfig")
+
+
 def create_tsvector(*args):
     exp = args[0]
     for e in args[1:]:
         exp += " " + e
-    return func.to_tsvector(cast(literal("english"), REGCONFIG), exp)
+    return func.to_tsvector(ENGLISH, exp)
 
 
 class AuthData(Base):
@@ -40,7 +54,9 @@ class User(Base):
     google_id: str | Column[str] = Column(String, unique=True, nullable=True)
     profile_pic: str | Column[str] = Column(String, unique=True, nullable=True)
     is_active: bool | Column[bool] = Column(Boolean, default=True)
+    # legacy, no longer written: membership lives in room_members
     rooms_joined: list[Never | str] | Column[Never] = Column(ARRAY(String), default=[])
+    # legacy, no longer written: friendships live in the friendships table
     friends: list[Never | str] | Column[Never] = Column(
         ARRAY(UUID(as_uuid=True)), default=[]
     )
@@ -50,6 +66,18 @@ class User(Base):
     sent_messages = relationship("MessageModel", back_populates="sender")
     posts_created = relationship("PostModel", back_populates="post_relationship")
 
-    __ts_vector__ = create_tsvector(cast(func.coalesce(username, ""), TEXT))
+    __ts_vector__ = create_tsvector(
+        cast(func.coalesce(username, literal_column("''")), TEXT)
+    )
 
-    __table_args__ = (Index("idx_person_fts", __ts_vector__, postgresql_using="gin"),)
+    __table_args__ = (
+        Index("idx_person_fts", __ts_vector__, postgresql_using="gin"),
+        # fuzzy and prefix username search (needs the pg_trgm extension)
+        Index(
+            "ix_users_username_trgm",
+            username,
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+            info={"extension": "pg_trgm"},
+        ),
+    )
@@ -0,0 +1,17 @@
+# Constants for the chat service, overridable through the .env file.
+from typing import Final
+
+from dotenv import dotenv_values
+
+
+class ChatConfig(object):
+    config = dotenv_values(".env")
+    # "per_room": channels_{room_id}/messages_{room_id} tables per room
+    # "consolidated": the global channels/messages tables, hash-partitioned
+    # by room (see migrate_to_consolidated for moving existing rooms over)
+    STORAGE_MODE: Final = config.get("CHAT_STORAGE_MODE", "per_room")
+    MESSAGE_PARTITIONS: Final = int(config.get("MESSAGE_PARTITIONS", 16))
+    REDIS_URL: Final = config.get("REDIS_URL", "redis://redis:6379")
+    # per-user room list behind /rooms/fetch, dropped on every membership
+    # or room change, the ttl only bounds what a missed invalidation costs
+    ROOM_LIST_CACHE_TTL: Final = int(config.get("ROOM_LIST_CACHE_TTL", 3600))
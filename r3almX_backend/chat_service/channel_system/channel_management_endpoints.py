@@ -2,7 +2,6 @@ import datetime
 import time
 import uuid
 
-import redis
 from fastapi import Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy import delete, select
@@ -11,15 +10,17 @@ from r3almX_backend.auth_service.auth_utils import get_current_user
 from r3almX_backend.auth_service.user_handler_utils import get_db
 from r3almX_backend.auth_service.user_models import User
 from r3almX_backend.chat_service.channel_system.channel_utils import (
-    get_channel_model,
-    get_message_model,
     insert_to_channels_table,
     insert_to_messages_table,
+    resolve_channel_model,
+    resolve_message_model,
+    room_scope,
 )
 from r3almX_backend.chat_service.channel_system.main import channel_manager
 from r3almX_backend.chat_service.models.channels_model import ChannelsModel
 from r3almX_backend.chat_service.models.rooms_model import RoomsModel
 from r3almX_backend.database import *
+from r3almX_backend.realtime_service.message_cache import message_cache
 
 
 class MessageModel(BaseModel):
@@ -59,8 +60,10 @@ async def fetch_channels(
     db: AsyncSession = Depends(get_db),
 ):
     try:
-        _channel_query = get_channel_model(room_id)
-        channels = await db.execute(select(_channel_query))
+        _channel_query = resolve_channel_model(room_id)
+        channels = await db.execute(
+            select(_channel_query).where(*room_scope(_channel_query, room_id))
+        )
 
         return {"status": 200, "channels": channels.scalars().all()}
     except Exception as e:
@@ -99,17 +102,19 @@ async def edit_channel(
 async def delete_channel(
     channel_id, room_id, user: User = Depends(get_current_user), db=Depends(get_db)
 ):
-    temp_redis = redis.Redis().from_url(
-        url="redis://172.22.96.1:6379", decode_responses=True, db=1
-    )
     try:
         # Get the models for channel and message based on room_id
-        channel_query = get_channel_model(room_id)
-        message_table = get_message_model(room_id)
+        channel_query = resolve_channel_model(room_id)
+        message_table = resolve_message_model(room_id)
 
         # Delete all messages associated with the channel
-        messages = delete(message_table).where(message_table.channel_id == channel_id)
-        channels = delete(channel_query).where(channel_query.id == channel_id)
+        messages = delete(message_table).where(
+            message_table.channel_id == channel_id,
+            *room_scope(message_table, room_id),
+        )
+        channels = delete(channel_query).where(
+            channel_query.id == channel_id, *room_scope(channel_query, room_id)
+        )
         await db.execute(messages)
         await db.execute(channels)
 
@@ -127,11 +132,10 @@ async def delete_channel(
         ) from e
     try:
         # remove the cache entry
-        temp_redis.delete(f"room:{room_id}:channel:{channel_id}:messages")
+        await message_cache.clear(room_id, channel_id)
     except Exception as e:
         print(e, "\n")
         raise HTTPException(status_code=500, detail=f"Failed to remove cache: {e}") from e
-    temp_redis.close()
     return {"message": "Channel and its messages deleted successfully."}
 
 
@@ -1,80 +1,138 @@
 import datetime
 import uuid
-from typing import Any, Dict, List
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Table
+from sqlalchemy import Column, DateTime, ForeignKey, MetaData, String, Table
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.ext.declarative import DeclarativeMeta
-from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import registry
 
 from r3almX_backend.auth_service.user_models import User
-from r3almX_backend.database import AsyncSession, Base, metadata_obj
+from r3almX_backend.chat_service.Config import ChatConfig
+from r3almX_backend.chat_service.models.channels_model import (
+    ChannelsModel,
+    MessageModel,
+    RowDictMixin,
+)
+from r3almX_backend.database import AsyncSession, Base
+from r3almX_backend.database.ids import uuid7
+
+
+def get_dynamic_model(
+    table_name: str, columns: List[Column[Any]], room_registry: registry
+) -> Any:
+    table = Table(table_name, room_registry.metadata, *columns)
+    model = type(
+        f"DynamicModel_{table_name}",
+        (RowDictMixin,),
+        {"__tablename__": table_name, "__table__": table},
+    )
+    room_registry.map_imperatively(model, table)
+    return model
+
+
+# most recently used rooms keep their mapped classes, older ones are dropped.
+# every room maps onto its own registry and MetaData, so nothing is left in
+# Base: an evicted room's classes are only forgotten, never disposed, because
+# a caller may still hold one across an await, and they are garbage
+# collected with their registry once the last caller lets go.
+MODEL_CACHE_SIZE = 2048
+_room_models: "OrderedDict[str, Tuple[registry, Dict[str, Any]]]" = OrderedDict()
+
+
+def evict_room_models(room_id: str):
+    """
+    forget every cached model of a room, call this when the room is deleted.
+    also drops the tables create_channel_table/create_message_table
+    registered on Base.metadata for it.
+    """
+    _room_models.pop(str(room_id), None)
+    for table_name in (f"channels_{room_id}", f"messages_{room_id}"):
+        table = Base.metadata.tables.get(table_name)
+        if table is not None:
+            Base.metadata.remove(table)
+
+
+def get_cached_model(
+    room_id: str, kind: str, table_name: str, columns: Callable[[], List[Column[Any]]]
+) -> Any:
+    room_id = str(room_id)
+    cached = _room_models.get(room_id)
+    if cached is not None:
+        _room_models.move_to_end(room_id)
+        model = cached[1].get(kind)
+        if model is not None:
+            return model
+    else:
+        cached = _room_models[room_id] = (registry(metadata=MetaData()), {})
+
+    room_registry, models = cached
+    models[kind] = get_dynamic_model(table_name, columns(), room_registry)
+
+    while len(_room_models) > MODEL_CACHE_SIZE:
+        _room_models.popitem(last=False)
+    return models[kind]
 
 
-class DynamicModelMeta(DeclarativeMeta):
-    def __new__(cls, name, bases, attrs):
-        if "__tablename__" in attrs and "__table__" not in attrs:
-            attrs["__table__"] = Table(
-                attrs["__tablename__"], metadata_obj, *attrs.get("__table_args__", ())
-            )
-        return super().__new__(cls, name, bases, attrs)
+def get_channel_model(room_id: str) -> Any:
+    return get_cached_model(
+        room_id,
+        "channel",
+        f"channels_{room_id}",
+        lambda: [
+            Column("id", UUID(as_uuid=True), primary_key=True),
+            Column("channel_name", String()),
+            Column("channel_description", String()),
+            Column("author", UUID(as_uuid=True)),
+            Column(
+                "time_created", DateTime(timezone=False), default=datetime.datetime.now
+            ),
+        ],
+    )
 
 
-class DynamicModelBase(Base, metaclass=DynamicModelMeta):
-    __abstract__ = True
+def get_message_model(room_id: str) -> Any:
+    return get_cached_model(
+        room_id,
+        "message",
+        f"messages_{room_id}",
+        lambda: [
+            Column("id", UUID(as_uuid=True), primary_key=True),
+            Column(
+                "channel_id", UUID(as_uuid=True), ForeignKey(f"channels_{room_id}.id")
+            ),
+            # users lives on Base.metadata, so point at the column itself
+            Column("sender_id", UUID(as_uuid=True), ForeignKey(User.__table__.c.id)),
+            Column("message", String()),
+            Column(
+                "timestamp", DateTime(timezone=False), default=datetime.datetime.now
+            ),
+        ],
+    )
 
-    def to_dict(self) -> Dict[str, Any]:
-        result = {}
-        for c in inspect(self.__class__).mapper.column_attrs:
-            value = getattr(self, c.key, None)
-            if isinstance(value, uuid.UUID):
-                result[c.key] = str(value)
-            elif isinstance(value, datetime.datetime):
-                result[c.key] = value.isoformat()
-            else:
-                result[c.key] = str(value)
-        return result
 
+def consolidated_storage() -> bool:
+    return ChatConfig.STORAGE_MODE == "consolidated"
 
-def get_dynamic_model(table_name: str, columns: List[Column[Any]]) -> Any:
-    return type(
-        f"DynamicModel_{table_name}",
-        (DynamicModelBase,),
-        {
-            "__tablename__": table_name,
-            "__table__": Table(
-                table_name,
-                metadata_obj,
-                *columns,  # Pass columns directly here
-                extend_existing=True  # Extend existing tables if necessary
-            ),
-        },
-    )
 
+def resolve_channel_model(room_id: str) -> Any:
+    """the model holding a room's channels in the configured storage mode"""
+    return ChannelsModel if consolidated_storage() else get_channel_model(room_id)
 
 
-def get_channel_model(room_id: str) -> Any:
-    table_name = f"channels_{room_id}"
-    columns = [
-        Column("id", UUID(as_uuid=True), primary_key=True),
-        Column("channel_name", String()),
-        Column("channel_description", String()),
-        Column("author", UUID(as_uuid=True)),
-        Column("time_created", DateTime(timezone=False), default=datetime.datetime.now),
-    ]
-    return get_dynamic_model(table_name, columns)
+def resolve_message_model(room_id: str) -> Any:
+    """the model holding a room's messages in the configured storage mode"""
+    return MessageModel if consolidated_storage() else get_message_model(room_id)
 
 
-def get_message_model(room_id: str) -> Any:
-    table_name = f"messages_{room_id}"
-    columns = [
-        Column("id", UUID(as_uuid=True), primary_key=True),
-        Column("channel_id", UUID(as_uuid=True), ForeignKey(f"channels_{room_id}.id")),
-        Column("sender_id", UUID(as_uuid=True), ForeignKey("users.id")),
-        Column("message", String()),
-        Column("timestamp", DateTime(timezone=False), default=datetime.datetime.now),
-    ]
-    return get_dynamic_model(table_name, columns)
+def room_scope(model: Any, room_id: str) -> list:
+    """
+    extra where-clauses that restrict a resolved model to one room. empty
+    for per-room tables, a room_id filter (and partition pruning) otherwise.
+    """
+    if model is ChannelsModel or model is MessageModel:
+        return [model.room_id == room_id]
+    return []
 
 
 async def insert_to_channels_table(
@@ -85,7 +143,7 @@ async def insert_to_channels_table(
     channel_description: str,
 ) -> UUID:
     try:
-        ChannelModel = get_channel_model(room_id)
+        ChannelModel = resolve_channel_model(room_id)
         channel_id = uuid.uuid4()
         new_channel = ChannelModel(
             id=channel_id,
@@ -93,6 +151,8 @@ async def insert_to_channels_table(
             channel_description=channel_description,
             author=user.id,
         )
+        if consolidated_storage():
+            new_channel.room_id = room_id
         db.add(new_channel)
         await db.commit()
         return channel_id
@@ -106,14 +166,16 @@ async def insert_to_messages_table(
     room_id: str, db: AsyncSession, channel_id: str, user: User, message: str
 ) -> UUID:
     try:
-        MessageModel = get_message_model(room_id)
-        message_id = uuid.uuid4()
-        new_message = MessageModel(
+        Model = resolve_message_model(room_id)
+        message_id = uuid7()
+        new_message = Model(
             id=message_id,
             channel_id=channel_id,
             sender_id=user.id,
             message=message,
         )
+        if consolidated_storage():
+            new_message.room_id = room_id
         db.add(new_message)
         await db.commit()
         return message_id
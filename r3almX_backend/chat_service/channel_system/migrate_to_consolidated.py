@@ -0,0 +1,126 @@
+"""
+copies every room's channels_{room_id}/messages_{room_id} tables into the
+consolidated, room-partitioned channels/messages tables.
+
+rows are read in keyset batches (ORDER BY id, WHERE id > last) and written
+with ON CONFLICT DO NOTHING, one commit per batch, so memory stays flat on
+large rooms and an interrupted run can simply be started again.
+
+    python -m r3almX_backend.chat_service.channel_system.migrate_to_consolidated
+
+set CHAT_STORAGE_MODE=consolidated once it finishes. the per-room tables are
+left in place, drop them after checking the copy.
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.dialects.postgresql import insert
+
+from r3almX_backend.chat_service.channel_system.channel_utils import (
+    evict_room_models,
+    get_channel_model,
+    get_message_model,
+)
+from r3almX_backend.chat_service.models.channels_model import (
+    ChannelsModel,
+    MessageModel,
+)
+from r3almX_backend.chat_service.models.rooms_model import RoomsModel
+from r3almX_backend.database import Base, SessionLocal, engine
+
+
+async def prepare_tables():
+    """
+    create the consolidated tables. a messages table created before it was
+    partitioned (no room_id column) is replaced if it is empty.
+    """
+    async with engine.begin() as conn:
+        columns = await conn.run_sync(
+            lambda sync_conn: (
+                [c["name"] for c in inspect(sync_conn).get_columns("messages")]
+                if inspect(sync_conn).has_table("messages")
+                else None
+            )
+        )
+        if columns is not None and "room_id" not in columns:
+            count = await conn.scalar(select(func.count()).select_from(MessageModel))
+            if count:
+                raise SystemExit(
+                    "messages exists without room_id and holds rows, "
+                    "move them aside before migrating"
+                )
+            await conn.run_sync(MessageModel.__table__.drop)
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[ChannelsModel.__table__, MessageModel.__table__],
+        )
+
+
+async def table_exists(table_name: str) -> bool:
+    async with engine.connect() as conn:
+        return await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table(table_name)
+        )
+
+
+async def copy_table(source, target, room_id, batch_size: int) -> int:
+    """stream source into target in id order, tagging rows with room_id"""
+    copied = 0
+    last_id = None
+    stmt = insert(target).on_conflict_do_nothing(
+        index_elements=[column.name for column in target.primary_key]
+    )
+    while True:
+        query = select(source).order_by(source.c.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(source.c.id > last_id)
+
+        async with SessionLocal() as db:
+            rows = (await db.execute(query)).mappings().all()
+            if not rows:
+                return copied
+            await db.execute(stmt, [{**row, "room_id": room_id} for row in rows])
+            await db.commit()
+
+        copied += len(rows)
+        last_id = rows[-1]["id"]
+
+
+async def migrate(batch_size: int, only_room: str | None = None):
+    await prepare_tables()
+
+    async with SessionLocal() as db:
+        query = select(RoomsModel.id)
+        if only_room:
+            query = query.where(RoomsModel.id == only_room)
+        room_ids = [str(room_id) for room_id in (await db.scalars(query)).all()]
+
+    for room_id in room_ids:
+        channels_table = get_channel_model(room_id).__table__
+        messages_table = get_message_model(room_id).__table__
+
+        if not await table_exists(channels_table.name):
+            print(f"room {room_id}: no per-room tables, skipping")
+            evict_room_models(room_id)
+            continue
+
+        channels = await copy_table(
+            channels_table, ChannelsModel.__table__, room_id, batch_size
+        )
+        messages = 0
+        if await table_exists(messages_table.name):
+            messages = await copy_table(
+                messages_table, MessageModel.__table__, room_id, batch_size
+            )
+        print(f"room {room_id}: {channels} channels, {messages} messages copied")
+        evict_room_models(room_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--room", help="only migrate this room id")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.room))
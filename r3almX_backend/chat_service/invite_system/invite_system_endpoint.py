@@ -1,10 +1,16 @@
 from fastapi import Depends, HTTPException
+from sqlalchemy import select
 
 from r3almX_backend.auth_service.auth_utils import get_current_user
 from r3almX_backend.auth_service.user_handler_utils import get_db
 from r3almX_backend.auth_service.user_models import User
 from r3almX_backend.chat_service.invite_system.main import invite_system
 from r3almX_backend.chat_service.models.rooms_model import RoomsModel
+from r3almX_backend.chat_service.room_service.membership import add_member
+from r3almX_backend.chat_service.room_service.room_list_cache import (
+    room_list_cache,
+    room_member_cache,
+)
 
 INVALID_ROOM_ID_MESSAGE = "Invalid room ID"
 ROOM_NOT_FOUND_MESSAGE = "Room not found"
@@ -52,36 +58,20 @@ async def join(
     invite_key: str, user: User = Depends(get_current_user), db=Depends(get_db)
 ):
     room_query = (
-        db.query(RoomsModel).filter(RoomsModel.invite_key == invite_key).first()
-    )
+        await db.execute(select(RoomsModel).filter(RoomsModel.invite_key == invite_key))
+    ).scalars().first()
 
     if room_query:
-        if str(user.id) in room_query.members:
-            print(room_query.members)
+        # one row in room_members, the room itself is not rewritten
+        if not await add_member(db, room_query.id, user.id):
             return {
                 "status": 302,
                 "message": f"user {user.id} is already in room {room_query.room_name}",
             }
         else:
-            (
-                db.query(RoomsModel)
-                .filter(RoomsModel.invite_key == invite_key)
-                .update({RoomsModel.members: room_query.members + [user.id]})
-            )
-
-            (
-                db.query(User)
-                .filter(User.id == user.id)
-                .update({User.rooms_joined: user.rooms_joined + [room_query.id]})
-            )
-
-            db.add(room_query)
-            db.add(user)
-
-            db.commit()
-
-            db.refresh(room_query)
-            db.refresh(user)
+            await db.commit()
+            await room_list_cache.invalidate([user.id])
+            await room_member_cache.invalidate([room_query.id])
 
             return {
                 "status": 200,
@@ -1,14 +1,32 @@
 import datetime
 import uuid
+from typing import Any, Dict
 
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import DDL, Column, DateTime, ForeignKey, Index, String, event
 from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import relationship
 
+from r3almX_backend.chat_service.Config import ChatConfig
 from r3almX_backend.database import Base
+from r3almX_backend.database.ids import uuid7
 
 
-class ChannelsModel(Base):
+class RowDictMixin:
+    def to_dict(self) -> Dict[str, Any]:
+        result = {}
+        for c in inspect(self.__class__).mapper.column_attrs:
+            value = getattr(self, c.key, None)
+            if isinstance(value, uuid.UUID):
+                result[c.key] = str(value)
+            elif isinstance(value, datetime.datetime):
+                result[c.key] = value.isoformat()
+            else:
+                result[c.key] = str(value)
+        return result
+
+
+class ChannelsModel(RowDictMixin, Base):
     __tablename__ = "channels"
     id = Column(UUID(as_uuid=True), default=uuid.uuid4, primary_key=True, index=True)
     room_id = Column(UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"))
@@ -21,20 +39,49 @@ class ChannelsModel(Base):
         "MessageModel", back_populates="channel", cascade="all, delete-orphan"
     )
 
-    def __init__(self, channel_name, channel_description, author):
+    def __init__(
+        self, channel_name, channel_description, author, room_id=None, id=None
+    ):
         self.channel_name = channel_name
         self.channel_description = channel_description
         self.author = author
+        self.room_id = room_id
+        self.id = id
+
 
+class MessageModel(RowDictMixin, Base):
+    """
+    messages of every room in one table, hash-partitioned on room_id so
+    each partition stays small and a room's history lives in one of them.
+    the partition key has to be part of the primary key.
+    """
 
-class MessageModel(Base):
     __tablename__ = "messages"
-    id = Column(UUID(as_uuid=True), default=uuid.uuid4, primary_key=True, index=True)
+    # time-ordered so inserts append to the right edge of the index
+    id = Column(UUID(as_uuid=True), default=uuid7, primary_key=True, index=True)
+    room_id = Column(UUID(as_uuid=True), primary_key=True)
     channel_id = Column(
         UUID(as_uuid=True), ForeignKey("channels.id", ondelete="CASCADE")
     )
     sender_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     message = Column(String())
-    timestamp = Column(DateTime(), default=datetime.datetime.now(datetime.UTC))
+    timestamp = Column(DateTime(), default=datetime.datetime.now)
     channel = relationship("ChannelsModel", back_populates="messages")
     sender = relationship("User", back_populates="sent_messages")
+
+    __table_args__ = (
+        Index("ix_messages_channel_timestamp", "channel_id", "timestamp"),
+        {"postgresql_partition_by": "HASH (room_id)"},
+    )
+
+
+for _remainder in range(ChatConfig.MESSAGE_PARTITIONS):
+    event.listen(
+        MessageModel.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TABLE IF NOT EXISTS messages_p{_remainder} PARTITION OF messages "
+            f"FOR VALUES WITH (MODULUS {ChatConfig.MESSAGE_PARTITIONS}, "
+            f"REMAINDER {_remainder})"
+        ),
+    )
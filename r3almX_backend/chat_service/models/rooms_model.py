@@ -1,8 +1,9 @@
 import base64
+import datetime
 import uuid
 from typing import Never
 
-from sqlalchemy import Column, ForeignKey, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.orm import relationship
 
@@ -19,6 +20,7 @@ class RoomsModel(Base):
     )
     room_name: str | Column[str] = Column(String())
     invite_key: str | Column[str] = Column(String())
+    # legacy, no longer written: membership lives in room_members
     members: list[Never | str] | Column[Never] = Column(ARRAY(String), default=[])
     owner = relationship("User", back_populates="owned_rooms")
     channels = relationship("ChannelsModel", back_populates="room")
@@ -26,7 +28,27 @@ class RoomsModel(Base):
     def __init__(self, room_owner: str, room_name: str):
         self.room_owner = room_owner
         self.room_name = room_name
-        self.members = list(self.room_owner)
         self.invite_key = base64.urlsafe_b64encode(uuid.uuid4().bytes)[:8].decode(
             "utf-8"
         )
+
+
+class RoomMembersModel(Base):
+    """
+    one row per (room, user). the primary key serves a room's member list in
+    user id order, ix_room_members_user_room the rooms of a user, so joining
+    or leaving touches a single row whatever the size of the room.
+    """
+
+    __tablename__ = "room_members"
+    room_id: Column[uuid.UUID] = Column(
+        UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Column[uuid.UUID] = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    joined_at: Column[datetime.datetime] = Column(
+        DateTime(), default=datetime.datetime.now
+    )
+
+    __table_args__ = (Index("ix_room_members_user_room", "user_id", "room_id"),)
@@ -1,11 +1,12 @@
 import datetime
 import uuid
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Table
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String, Table
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
 from r3almX_backend.database import Base
+from r3almX_backend.database.ids import uuid7
 
 
 def create_channel_table(room_id):
@@ -29,11 +30,12 @@ def create_message_table(room_id):
     return Table(
         table_name,
         Base.metadata,
-        Column(
-            "id", UUID(as_uuid=True), default=uuid.uuid4, primary_key=True, index=True
-        ),
+        # time-ordered so inserts append to the right edge of the index
+        Column("id", UUID(as_uuid=True), default=uuid7, primary_key=True, index=True),
         Column("channel_id", UUID(as_uuid=True), ForeignKey(f"channels_{room_id}.id")),
         Column("sender_id", UUID(as_uuid=True), ForeignKey("users.id")),
         Column("message", String()),
         Column("timestamp", DateTime(), default=datetime.datetime.now(datetime.UTC)),
+        # keyset pagination of channel history
+        Index(f"ix_{table_name}_channel_ts", "channel_id", "timestamp", "id"),
     )
@@ -0,0 +1,114 @@
+"""
+fills room_members from the legacy membership arrays, RoomsModel.members and
+User.rooms_joined.
+
+both tables are read in keyset batches (ORDER BY id, WHERE id > last) and
+the pairs are written with ON CONFLICT DO NOTHING, one commit per batch, so
+memory stays flat and an interrupted run can simply be started again.
+entries that are not uuids, or that point at a room or user which no longer
+exists, are skipped and counted.
+
+    python -m r3almX_backend.chat_service.room_service.backfill_room_members
+
+the arrays are left in place, they are no longer written.
+"""
+
+import argparse
+import asyncio
+import uuid
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.chat_service.models.rooms_model import (
+    RoomMembersModel,
+    RoomsModel,
+)
+from r3almX_backend.database import Base, SessionLocal, engine
+
+
+def parse_ids(values: Iterable) -> List[uuid.UUID]:
+    ids = []
+    for value in values or ():
+        try:
+            ids.append(value if isinstance(value, uuid.UUID) else uuid.UUID(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+async def existing(db, column, ids: Set[uuid.UUID]) -> Set[uuid.UUID]:
+    if not ids:
+        return set()
+    return set((await db.scalars(select(column).where(column.in_(ids)))).all())
+
+
+async def backfill_from(
+    source, array_column, target_column, batch_size: int
+) -> Tuple[int, int]:
+    """
+    stream (id, array) rows of one side and insert the pairs whose other
+    side exists. returns (pairs written or already there, entries skipped)
+    """
+    written = skipped = 0
+    last_id = None
+    stmt = insert(RoomMembersModel).on_conflict_do_nothing(
+        index_elements=["room_id", "user_id"]
+    )
+    while True:
+        query = select(source.id, array_column).order_by(source.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(source.id > last_id)
+
+        async with SessionLocal() as db:
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return written, skipped
+
+            pairs = {row[0]: parse_ids(row[1]) for row in rows}
+            skipped += sum(len(row[1] or ()) for row in rows) - sum(
+                len(ids) for ids in pairs.values()
+            )
+            known = await existing(
+                db, target_column, {other for ids in pairs.values() for other in ids}
+            )
+            values = []
+            for own_id, others in pairs.items():
+                for other in dict.fromkeys(others):
+                    if other not in known:
+                        skipped += 1
+                    elif source is RoomsModel:
+                        values.append({"room_id": own_id, "user_id": other})
+                    else:
+                        values.append({"room_id": other, "user_id": own_id})
+            if values:
+                await db.execute(stmt, values)
+                await db.commit()
+
+        written += len(values)
+        last_id = rows[-1][0]
+
+
+async def backfill(batch_size: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all, tables=[RoomMembersModel.__table__]
+        )
+
+    written, skipped = await backfill_from(
+        RoomsModel, RoomsModel.members, User.id, batch_size
+    )
+    print(f"rooms.members: {written} memberships, {skipped} entries skipped")
+    written, skipped = await backfill_from(
+        User, User.rooms_joined, RoomsModel.id, batch_size
+    )
+    print(f"users.rooms_joined: {written} memberships, {skipped} entries skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size))
@@ -0,0 +1,79 @@
+import uuid
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.chat_service.models.rooms_model import RoomMembersModel
+from r3almX_backend.database import AsyncSession
+
+MEMBER_PAGE_LIMIT = 200
+
+
+async def add_member(db: AsyncSession, room_id, user_id) -> bool:
+    """single-row insert; False if the user already was a member (no commit)"""
+    result = await db.execute(
+        insert(RoomMembersModel)
+        .values(room_id=room_id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["room_id", "user_id"])
+        .returning(RoomMembersModel.user_id)
+    )
+    return result.first() is not None
+
+
+async def remove_member(db: AsyncSession, room_id, user_id) -> bool:
+    """single-row delete; False if the user was not a member (no commit)"""
+    result = await db.execute(
+        delete(RoomMembersModel)
+        .where(
+            RoomMembersModel.room_id == room_id,
+            RoomMembersModel.user_id == user_id,
+        )
+        .returning(RoomMembersModel.user_id)
+    )
+    return result.first() is not None
+
+
+async def is_member(db: AsyncSession, room_id, user_id) -> bool:
+    return await db.get(RoomMembersModel, (room_id, user_id)) is not None
+
+
+async def member_ids(db: AsyncSession, room_id, limit: int | None = None) -> List[str]:
+    query = (
+        select(RoomMembersModel.user_id)
+        .where(RoomMembersModel.room_id == room_id)
+        .order_by(RoomMembersModel.user_id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [str(user_id) for user_id in (await db.scalars(query)).all()]
+
+
+async def list_members(
+    db: AsyncSession, room_id, after: uuid.UUID | str | None, limit: int
+) -> List[dict]:
+    """a page of members in user id order, keyset on the primary key"""
+    query = (
+        select(
+            RoomMembersModel.user_id,
+            RoomMembersModel.joined_at,
+            User.username,
+            User.profile_pic,
+        )
+        .join(User, User.id == RoomMembersModel.user_id)
+        .where(RoomMembersModel.room_id == room_id)
+        .order_by(RoomMembersModel.user_id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(RoomMembersModel.user_id > after)
+    return [
+        {
+            "id": str(row.user_id),
+            "username": row.username,
+            "profile_pic": row.profile_pic,
+            "joined_at": row.joined_at,
+        }
+        for row in (await db.execute(query)).all()
+    ]
@@ -0,0 +1,164 @@
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+import redis.asyncio as redis
+from pydantic import BaseModel
+from sqlalchemy import select
+
+from r3almX_backend.chat_service.Config import ChatConfig
+from r3almX_backend.chat_service.models.rooms_model import (
+    RoomMembersModel,
+    RoomsModel,
+)
+from r3almX_backend.chat_service.room_service.membership import member_ids
+from r3almX_backend.database import AsyncSession
+
+INVALIDATE_CHUNK = 1000
+
+# store a freshly loaded list only if no invalidation happened since its
+# version was read. KEYS: list, version; ARGV: version read, list, ttl
+FILL_IF_CURRENT = """
+if (redis.call('get', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RoomSummary(BaseModel):
+    """what the sidebar needs of a room, nothing the owner alone should see"""
+
+    id: str
+    room_name: str | None
+    room_owner: str | None
+
+
+class VersionedCache:
+    """
+    one JSON value per id in a redis string, filled by load() on a miss and
+    dropped by invalidate().
+
+    invalidation also bumps the id's version key, and a fill only lands if
+    the version is the one read before load() ran, so a value loaded just
+    before a change is never cached after it.
+    """
+
+    name = "cache"
+
+    def __init__(self, ttl: int = ChatConfig.ROOM_LIST_CACHE_TTL):
+        self.ttl = ttl
+        self.redis_client = redis.Redis().from_url(
+            url=ChatConfig.REDIS_URL, decode_responses=True, db=1
+        )
+
+    @staticmethod
+    def key(ident) -> str:
+        raise NotImplementedError
+
+    def version_key(self, ident) -> str:
+        return f"{self.key(ident)}:version"
+
+    async def load(self, db: AsyncSession, ident) -> Any:
+        raise NotImplementedError
+
+    async def read(self, ident) -> Tuple[Any, str | None]:
+        """(cached value or None, version to fill with) in one round trip"""
+        try:
+            cached, version = await self.redis_client.mget(
+                self.key(ident), self.version_key(ident)
+            )
+        except Exception as e:
+            print(f"{self.name} read failed: {e}")
+            return None, None
+        return (json.loads(cached) if cached is not None else None), version
+
+    async def fill(self, db: AsyncSession, ident, version: str | None) -> Any:
+        value = await self.load(db, ident)
+        try:
+            await self.redis_client.eval(
+                FILL_IF_CURRENT,
+                2,
+                self.key(ident),
+                self.version_key(ident),
+                version or "",
+                json.dumps(value),
+                self.ttl,
+            )
+        except Exception as e:
+            print(f"{self.name} write failed: {e}")
+        return value
+
+    async def get(self, db: AsyncSession, ident) -> Any:
+        cached, version = await self.read(ident)
+        if cached is not None:
+            return cached
+        return await self.fill(db, ident, version)
+
+    async def invalidate(self, idents: Iterable):
+        idents = list(idents)
+        try:
+            for start in range(0, len(idents), INVALIDATE_CHUNK):
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for ident in idents[start : start + INVALIDATE_CHUNK]:
+                        # the version outlives any fill that could still land
+                        pipe.incr(self.version_key(ident))
+                        pipe.expire(self.version_key(ident), self.ttl)
+                        pipe.delete(self.key(ident))
+                    await pipe.execute()
+        except Exception as e:
+            print(f"{self.name} invalidation failed: {e}")
+
+
+class RoomListCache(VersionedCache):
+    """
+    each user's room list (rooms:user:{user_id}), filled by a single
+    membership join on a miss and dropped whenever the user joins, leaves or
+    creates a room, or a room they are in changes.
+    """
+
+    name = "room list cache"
+
+    @staticmethod
+    def key(user_id) -> str:
+        return f"rooms:user:{user_id}"
+
+    async def load(self, db: AsyncSession, user_id) -> List[Dict[str, Any]]:
+        rows = await db.execute(
+            select(RoomsModel.id, RoomsModel.room_name, RoomsModel.room_owner)
+            .join(RoomMembersModel, RoomMembersModel.room_id == RoomsModel.id)
+            .where(RoomMembersModel.user_id == user_id)
+        )
+        return [
+            RoomSummary(
+                id=str(row.id),
+                room_name=row.room_name,
+                room_owner=str(row.room_owner) if row.room_owner else None,
+            ).model_dump()
+            for row in rows
+        ]
+
+    async def invalidate_room(self, db: AsyncSession, room_id):
+        """every member's list, for changes to the room itself"""
+        await self.invalidate(await member_ids(db, room_id))
+
+
+class RoomMemberCache(VersionedCache):
+    """
+    each room's member ids (rooms:members:{room_id}), so the chat send path
+    finds who to notify without a database read. dropped whenever someone
+    joins or leaves the room, or it is deleted.
+    """
+
+    name = "room member cache"
+
+    @staticmethod
+    def key(room_id) -> str:
+        return f"rooms:members:{room_id}"
+
+    async def load(self, db: AsyncSession, room_id) -> List[str]:
+        return await member_ids(db, room_id)
+
+
+room_list_cache = RoomListCache()
+room_member_cache = RoomMemberCache()
@@ -1,20 +1,33 @@
-from uuid import uuid4
-
-from fastapi import Depends, HTTPException
-from sqlalchemy.event import listen
+from fastapi import Depends, HTTPException, Query
 from sqlalchemy import select
 
 from r3almX_backend.auth_service.auth_utils import get_current_user
 from r3almX_backend.auth_service.user_handler_utils import get_db
 from r3almX_backend.auth_service.user_models import User
-from r3almX_backend.chat_service.channel_system.channel_utils import get_channel_model
+from r3almX_backend.chat_service.channel_system.channel_utils import (
+    consolidated_storage,
+    evict_room_models,
+)
 from r3almX_backend.chat_service.models.rooms_model import RoomsModel
 from r3almX_backend.chat_service.models.rooms_table import (
     create_channel_table,
     create_message_table,
 )
 from r3almX_backend.chat_service.room_service.main import rooms_service
-from r3almX_backend.database import SessionLocal, engine, Base
+from r3almX_backend.chat_service.room_service.membership import (
+    MEMBER_PAGE_LIMIT,
+    add_member,
+    is_member,
+    list_members,
+    member_ids,
+    remove_member,
+)
+from r3almX_backend.chat_service.room_service.room_list_cache import (
+    RoomSummary,
+    room_list_cache,
+    room_member_cache,
+)
+from r3almX_backend.database import Base, engine
 
 INVALID_ROOM_ID_MESSAGE = "Invalid room ID"
 ROOM_NOT_FOUND_MESSAGE = "Room not found"
@@ -26,21 +39,24 @@ async def create_room_endpoint(
     room_name: str, user: User = Depends(get_current_user), db=Depends(get_db)
 ):
     new_room = RoomsModel(str(user.id) , room_name)
-    new_room.members = [str(user.id)]
 
     db.add(new_room)
+    await db.flush()
+    await add_member(db, new_room.id, user.id)
     await db.commit()
     await db.refresh(new_room)
 
-    channel_table = create_channel_table(new_room.id)
-    message_table = create_message_table(new_room.id)
-
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if not consolidated_storage():
+        channel_table = create_channel_table(new_room.id)
+        message_table = create_message_table(new_room.id)
 
-    # Update the user's rooms_joined
-    user.rooms_joined = user.rooms_joined + [str(new_room.id)]
-    await db.commit()
+        # only the new room's tables, not a pass over the whole catalog
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all, tables=[channel_table, message_table]
+            )
+    await room_list_cache.invalidate([user.id])
+    await room_member_cache.invalidate([new_room.id])
 
     return {"status": 200, "rooms": new_room, "user": user}
 
@@ -59,21 +75,44 @@ async def kick_user(
 
 @rooms_service.get("/fetch", tags=["Room"])
 async def fetch_rooms(user: User = Depends(get_current_user), db=Depends(get_db)):
-    rooms = []
+    # one redis read, or one membership join on a miss, whatever the room count
     try:
-        for users_rooms in set(user.rooms_joined):
-            rooms_query = await (
-                db.execute(select(RoomsModel).filter(RoomsModel.id == users_rooms))
-
-            )
-            _rooms_query = rooms_query.scalars().all()
-            rooms.append(_rooms_query[0])
-
+        rooms = await room_list_cache.get(db, user.id)
     except Exception as e:
         return {"status": 400, "error": str(e)}
     return {"status": 200, "rooms": rooms}
 
 
+@rooms_service.get("/members", tags=["Room"])
+async def fetch_members(
+    room_id: str,
+    after: str | None = None,
+    limit: int = Query(50, ge=1, le=MEMBER_PAGE_LIMIT),
+    user: User = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    if not await is_member(db, room_id, user.id):
+        raise HTTPException(status_code=404, detail=ROOM_NOT_FOUND_MESSAGE)
+    members = await list_members(db, room_id, after, limit)
+    return {
+        "status": 200,
+        "members": members,
+        "next_cursor": members[-1]["id"] if len(members) == limit else None,
+    }
+
+
+@rooms_service.post("/leave", tags=["Room"])
+async def leave_room(
+    room_id: str, user: User = Depends(get_current_user), db=Depends(get_db)
+):
+    if not await remove_member(db, room_id, user.id):
+        raise HTTPException(status_code=404, detail=ROOM_NOT_FOUND_MESSAGE)
+    await db.commit()
+    await room_list_cache.invalidate([user.id])
+    await room_member_cache.invalidate([room_id])
+    return {"status": 200}
+
+
 @rooms_service.put("/edit", tags=["Room"])
 async def edit_room(
     room_id: str,
@@ -81,34 +120,50 @@ async def edit_room(
     user: User = Depends(get_current_user),
     db=Depends(get_db),
 ):
-    room_to_update = (
-        db.query(RoomsModel)
+    room_query = await db.execute(
+        select(RoomsModel)
         .filter(RoomsModel.room_owner == user.id)
         .filter(RoomsModel.id == room_id)
-        .first()
     )
+    room_to_update = room_query.scalars().first()
 
     if room_to_update:
         room_to_update.room_name = new_name
-        db.commit()
-
-        return {"status": "room updated successfully", "update": room_to_update}
+        await db.commit()
+        await room_list_cache.invalidate_room(db, room_id)
+
+        return {
+            "status": "room updated successfully",
+            "update": RoomSummary(
+                id=str(room_to_update.id),
+                room_name=room_to_update.room_name,
+                room_owner=str(room_to_update.room_owner),
+            ),
+        }
+    else:
+        raise HTTPException(status_code=404, detail=PERMISSION_DENIED_MESSAGE)
 
 
 @rooms_service.delete("/delete", tags=["Room"])
 async def create_room(
     room_id: str, user: User = Depends(get_current_user), db=Depends(get_db)
 ):
-    room_to_delete = (
-        db.query(RoomsModel)
+    room_query = await db.execute(
+        select(RoomsModel)
         .filter(RoomsModel.room_owner == user.id)
         .filter(RoomsModel.id == room_id)
-        .first()
     )
+    room_to_delete = room_query.scalars().first()
 
     if room_to_delete:
-        db.delete(room_to_delete)
-        db.commit()
+        # the memberships go with the room, collect who to invalidate first
+        members = await member_ids(db, room_id)
+        await db.delete(room_to_delete)
+        await db.commit()
+        await room_list_cache.invalidate(members)
+        await room_member_cache.invalidate([room_id])
+        # release the room's cached channel/message models
+        evict_room_models(room_id)
         return {"status": 200}
     else:
         raise HTTPException(status_code=404, detail=PERMISSION_DENIED_MESSAGE)
@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_rand = 0
+
+RAND_BITS = 74
+RAND_MAX = (1 << RAND_BITS) - 1
+
+
+def uuid7() -> uuid.UUID:
+    """
+    time-ordered uuid (RFC 9562 version 7): 48 bits of unix milliseconds,
+    then 74 random bits. ids minted by this process are strictly increasing,
+    within one millisecond the random part is incremented instead of redrawn,
+    so they sort in the order they were generated and append to the right
+    edge of a btree index.
+    """
+    global _last_ms, _last_rand
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # the top bit stays clear so increments have room before overflowing
+            _last_rand = int.from_bytes(os.urandom(10), "big") >> 7
+        else:
+            _last_rand += 1 + (int.from_bytes(os.urandom(2), "big") & 0xFF)
+            if _last_rand > RAND_MAX:
+                # exhausted this millisecond, borrow the next one
+                _last_ms += 1
+                _last_rand = int.from_bytes(os.urandom(10), "big") >> 7
+        ms, rand = _last_ms, _last_rand
+
+    value = (ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= (rand >> 62) << 64  # rand_a, 12 bits
+    value |= 0b10 << 62  # variant
+    value |= rand & ((1 << 62) - 1)  # rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(value: uuid.UUID | str) -> float:
+    """unix seconds encoded in a uuid7"""
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+    return (value.int >> 80) / 1000
@@ -0,0 +1,77 @@
+"""
+fills friendships from the legacy User.friends arrays.
+
+users are read in keyset batches (ORDER BY id, WHERE id > last) and both
+directions of every pair are written with ON CONFLICT DO NOTHING, one commit
+per batch, so memory stays flat and an interrupted run can simply be started
+again. a friendship recorded on one side only is restored on both; ids that
+point at a user which no longer exists are skipped and counted.
+
+    python -m r3almX_backend.friends_service.backfill_friendships
+
+the arrays are left in place, they are no longer written.
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.database import Base, SessionLocal, engine
+from r3almX_backend.friends_service.friends_model import FriendshipModel
+
+
+async def backfill(batch_size: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all, tables=[FriendshipModel.__table__]
+        )
+
+    stmt = insert(FriendshipModel).on_conflict_do_nothing(
+        index_elements=["user_id", "friend_id"]
+    )
+    written = skipped = 0
+    last_id = None
+    while True:
+        query = select(User.id, User.friends).order_by(User.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+
+        async with SessionLocal() as db:
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+
+            wanted = {friend for row in rows for friend in row.friends or ()}
+            known = set()
+            if wanted:
+                known = set(
+                    (await db.scalars(select(User.id).where(User.id.in_(wanted)))).all()
+                )
+            pairs = set()
+            for row in rows:
+                for friend in row.friends or ():
+                    if friend not in known or friend == row.id:
+                        skipped += 1
+                        continue
+                    pairs.add((row.id, friend))
+                    pairs.add((friend, row.id))
+            if pairs:
+                await db.execute(
+                    stmt, [{"user_id": a, "friend_id": b} for a, b in pairs]
+                )
+                await db.commit()
+
+        written += len(pairs)
+        last_id = rows[-1].id
+
+    print(f"users.friends: {written} friendship rows, {skipped} entries skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size))
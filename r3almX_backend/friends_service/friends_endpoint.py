@@ -1,47 +1,43 @@
-from fastapi import Depends, HTTPException
-from sqlalchemy import func, select
+import uuid
+
+from fastapi import Depends, HTTPException, Query
 
 from r3almX_backend.auth_service.auth_utils import get_current_user
 from r3almX_backend.auth_service.user_handler_utils import (
     get_db,
-    get_user,
     get_user_by_username,
 )
 from r3almX_backend.auth_service.user_models import User
 from r3almX_backend.database import AsyncSession
+from r3almX_backend.friends_service.friendships import (
+    FRIEND_PAGE_LIMIT,
+    add_friendship,
+    are_friends,
+    list_friends,
+    remove_friendship,
+)
 from r3almX_backend.friends_service.main import friends_service
 
 
 @friends_service.get("/get")
 async def get_friends(
+    after: uuid.UUID | None = None,
+    limit: int = Query(50, ge=1, le=FRIEND_PAGE_LIMIT),
     user: User = Depends(get_current_user),
     db=Depends(get_db),
 ):
-    if len(user.friends) < 1:
+    friends_list = await list_friends(db, user.id, after, limit)
+    if not friends_list and after is None:
         return {"friends": "no friends :("}
-    try:
-        limit_numb = 2
-        if len(user.friends) <= 2:
-            limit_numb = len(user.friends)
-
-        friends_list = [
-            {
-                "user_id": friends.id,
-                "username": friends.username,
-                "pic": friends.profile_pic,
-            }
-            for friends in [
-                await get_user(db, str(_)) for _ in user.friends[0:limit_numb]
-            ]
-        ]
-
-        return {
-            "status": 200,
-            "friends": friends_list,
-        }
-
-    except IndexError as i:
-        raise HTTPException(status_code=500, detail="You don't have enough friends")
+
+    next_cursor = None
+    if len(friends_list) == limit:
+        next_cursor = friends_list[-1]["user_id"]
+    return {
+        "status": 200,
+        "friends": friends_list,
+        "next_cursor": next_cursor,
+    }
 
 
 @friends_service.post("/add")
@@ -53,43 +49,48 @@ async def make_friend(
 ):
     user_to_add = await get_user_by_username(db, username)
 
+    if user_to_add is None:
+        raise HTTPException(status_code=404, detail="User not found")
     if user_id and str(user_to_add.id) != user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    if user_to_add.id == user.id:
+        raise HTTPException(status_code=400, detail="Cannot befriend yourself")
 
-    are_friends = await db.execute(
-        select(User).where(
-            (User.id == user.id) & (User.friends.contains([user_to_add.id]))
-        )
-    )
-
-    if (are_friends.first()) is not None:
+    # both rows in one statement, so the friendship is never one-sided
+    if not await add_friendship(db, user.id, user_to_add.id):
         return {"status": 200, "friend_status": True, "message": "Already friends"}
+    await db.commit()
 
-    await db.execute(
-        User.__table__.update()
-        .where(User.id == user.id)
-        .values(friends=func.array_append(User.friends, user_to_add.id))
-    )
+    return {
+        "status": 200,
+        "friend_status": True,
+        "message": "Friend added successfully",
+    }
 
-    await db.execute(
-        User.__table__.update()
-        .where(User.id == user_to_add.id)
-        .values(friends=func.array_append(User.friends, user.id))
-    )
 
+@friends_service.post("/remove")
+async def remove_friend(
+    user_id: uuid.UUID,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if not await remove_friendship(db, user.id, user_id):
+        raise HTTPException(status_code=404, detail="Not friends")
     await db.commit()
 
     return {
         "status": 200,
-        "friend_status": True,
-        "message": "Friend added successfully",
+        "friend_status": False,
+        "message": "Friend removed successfully",
     }
 
 
 @friends_service.get("/status")
-async def check_friend_status(user_id: str, user=Depends(get_current_user)):
+async def check_friend_status(
+    user_id: uuid.UUID, user=Depends(get_current_user), db=Depends(get_db)
+):
 
-    if user_id in [str(_) for _ in user.friends]:
+    if await are_friends(db, user.id, user_id):
         return {"friend_status": True}
     else:
         return {"friends_status": False}
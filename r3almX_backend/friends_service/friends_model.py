@@ -0,0 +1,26 @@
+import datetime
+import uuid
+
+from sqlalchemy import Column, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from r3almX_backend.database import Base
+
+
+class FriendshipModel(Base):
+    """
+    one row per direction, (a, b) and (b, a), written and removed together.
+    a user's friends are a primary key range scan in friend id order and
+    "are a and b friends" is a single primary key lookup.
+    """
+
+    __tablename__ = "friendships"
+    user_id: Column[uuid.UUID] = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    friend_id: Column[uuid.UUID] = Column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    created_at: Column[datetime.datetime] = Column(
+        DateTime(), default=datetime.datetime.now
+    )
@@ -0,0 +1,75 @@
+import uuid
+from typing import List
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.database import AsyncSession
+from r3almX_backend.friends_service.friends_model import FriendshipModel
+
+FRIEND_PAGE_LIMIT = 200
+
+
+async def add_friendship(db: AsyncSession, user_id, friend_id) -> bool:
+    """both directions in one statement; False if they already were friends (no commit)"""
+    result = await db.execute(
+        insert(FriendshipModel)
+        .values(
+            [
+                {"user_id": user_id, "friend_id": friend_id},
+                {"user_id": friend_id, "friend_id": user_id},
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "friend_id"])
+        .returning(FriendshipModel.user_id)
+    )
+    return len(result.all()) > 0
+
+
+async def remove_friendship(db: AsyncSession, user_id, friend_id) -> bool:
+    """both directions in one statement; False if they were not friends (no commit)"""
+    result = await db.execute(
+        delete(FriendshipModel)
+        .where(
+            tuple_(FriendshipModel.user_id, FriendshipModel.friend_id).in_(
+                [(user_id, friend_id), (friend_id, user_id)]
+            )
+        )
+        .returning(FriendshipModel.user_id)
+    )
+    return len(result.all()) > 0
+
+
+async def are_friends(db: AsyncSession, user_id, friend_id) -> bool:
+    return await db.get(FriendshipModel, (user_id, friend_id)) is not None
+
+
+async def friend_ids(db: AsyncSession, user_id, limit: int | None = None) -> List[str]:
+    query = (
+        select(FriendshipModel.friend_id)
+        .where(FriendshipModel.user_id == user_id)
+        .order_by(FriendshipModel.friend_id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [str(friend_id) for friend_id in (await db.scalars(query)).all()]
+
+
+async def list_friends(
+    db: AsyncSession, user_id, after: uuid.UUID | str | None, limit: int
+) -> List[dict]:
+    """a page of friends in friend id order, hydrated by the same query"""
+    query = (
+        select(User.id, User.username, User.profile_pic)
+        .join(FriendshipModel, FriendshipModel.friend_id == User.id)
+        .where(FriendshipModel.user_id == user_id)
+        .order_by(FriendshipModel.friend_id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(FriendshipModel.friend_id > after)
+    return [
+        {"user_id": str(row.id), "username": row.username, "pic": row.profile_pic}
+        for row in (await db.execute(query)).all()
+    ]
@@ -1,110 +1,204 @@
 import json
 import logging
+import queue
+import random
+import sys
 import time
-from datetime import datetime
-from urllib.parse import parse_qs, urlparse
-
-from colorama import init
-from fastapi import Request, logger
-from loguru import logger
-from rich.console import Console
-from rich.json import JSON
-from rich.panel import Panel
-from rich.table import Table
-from starlette.requests import Request
-
-from r3almX_backend import r3almX
-
-from .version import __version__
-
-init(autoreset=True)
-
-# Initialize the logger
-logger = logging.getLogger("uvicorn")
-logger.setLevel(logging.INFO)
-
-# Initialize rich console
-console = Console()
-
-
-@r3almX.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-
-    # Gathering request details
-    ip_address = request.client.host
-    user_agent = request.headers.get("User-Agent", "N/A")
-    referrer = request.headers.get("Referer", "N/A")
-    method = request.method
-    url = str(request.url)  # Convert URL object to string
-    headers = dict(request.headers)
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-
-    # Optionally read the request body (Note: Be cautious with large bodies)
-    body = await request.body()
-    request_body = body.decode("utf-8") if body else "No Body"
-
-    # Process the request and get the response
-    response = await call_next(request)
-    response_time = time.time() - start_time
-    status_code = response.status_code
-
-    # Parse URL for additional context
-    parsed_url = urlparse(url)
-    query_params = parse_qs(parsed_url.query)
-
-    # Create a rich table for the request details
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Attribute", style="dim")
-    table.add_column("Value", overflow="fold")
-
-    table.add_row("IP Address", f"[green]{ip_address}[/green]")
-    table.add_row("User Agent", f"[yellow]{user_agent}[/yellow]")
-    table.add_row("Referer", f"[blue]{referrer}[/blue]")
-    table.add_row("Request Method", f"[cyan]{method}[/cyan]")
-    table.add_row("Request URL", f"[link={url}]{url}[/link]")
-    table.add_row("Timestamp", f"[white]{timestamp}[/white]")
-    table.add_row("Response Time", f"[white]{response_time:.3f} seconds[/white]")
-    table.add_row(
-        "Response Status",
-        (
-            f"[bold green]{status_code}[/bold green]"
-            if status_code < 400
-            else f"[bold red]{status_code}[/bold red]"
-        ),
-    )
-
-    # Display parsed query parameters if any
-    if query_params:
-        query_panel = Panel.fit(
-            JSON(json.dumps(query_params, indent=2)),
-            title="Query Parameters",
-            border_style="magenta",
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from r3almX_backend.Config import AppConfig
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """one compact JSON object per request"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            **record.access,
+        }
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+
+
+class RichAccessHandler(logging.Handler):
+    """dev mode: the old request table, rendered in the listener thread"""
+
+    def __init__(self):
+        super().__init__()
+        from rich.console import Console
+
+        self.console = Console()
+
+    def emit(self, record: logging.LogRecord):
+        from rich.panel import Panel
+        from rich.table import Table
+
+        entry: Dict[str, Any] = record.access
+        status_code = entry["status"]
+        timestamp = datetime.fromtimestamp(record.created).strftime(
+            "%Y-%m-%d %H:%M:%S.%f"
+        )[:-3]
+        url = entry["path"] + (f"?{entry['query']}" if entry["query"] else "")
+
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Attribute", style="dim")
+        table.add_column("Value", overflow="fold")
+
+        table.add_row("IP Address", f"[green]{entry['client']}[/green]")
+        table.add_row("User Agent", f"[yellow]{entry['user_agent']}[/yellow]")
+        table.add_row("Referer", f"[blue]{entry['referer']}[/blue]")
+        table.add_row("Request Method", f"[cyan]{entry['method']}[/cyan]")
+        table.add_row("Request URL", url)
+        table.add_row("Timestamp", f"[white]{timestamp}[/white]")
+        table.add_row("Response Time", f"[white]{entry['duration_ms']:.3f} ms[/white]")
+        table.add_row("Response Bytes", f"[white]{entry['bytes']}[/white]")
+        table.add_row(
+            "Response Status",
+            (
+                f"[bold green]{status_code}[/bold green]"
+                if status_code < 400
+                else f"[bold red]{status_code}[/bold red]"
+            ),
         )
-    else:
-        query_panel = None
-
-    # Create rich JSON formatted headers and body
-    formatted_headers = JSON(json.dumps(headers, indent=2))
-    formatted_body = JSON(json.dumps({"body": request_body}, indent=2))
-
-    # Print each section separately with rich console for proper rendering
-    console.print(
-        Panel(
-            "[bold cyan]HTTP Request Log[/bold cyan]",
-            title="📘",
-            border_style="blue",
-            expand=False,
+        self.console.print(Panel.fit(table, title="Request Details", border_style="cyan"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """drops the entry instead of raising when the bounded queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLog:
+    """
+    access log sink. the request path only builds a small dict and puts it on
+    a bounded queue; formatting and writing happen on a QueueListener thread
+    so a slow terminal or disk never stalls the event loop. entries are only
+    queued while the listener runs, and dropped when it falls behind.
+    """
+
+    def __init__(
+        self,
+        mode: str = AppConfig.ACCESS_LOG_MODE,
+        sample_rate: float = AppConfig.ACCESS_LOG_SAMPLE_RATE,
+        always_status: int = AppConfig.ACCESS_LOG_ALWAYS_STATUS,
+        path: str = AppConfig.ACCESS_LOG_FILE,
+        queue_size: int = AppConfig.ACCESS_LOG_QUEUE_SIZE,
+    ):
+        self.mode = mode
+        self.enabled = mode != "off"
+        self.sample_rate = sample_rate
+        self.always_status = always_status
+        self.path = path
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.listener: QueueListener | None = None
+
+        self.handler = DroppingQueueHandler(self.queue)
+        self.logger = logging.getLogger("r3almx.access")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [self.handler]
+
+    def build_handler(self) -> logging.Handler:
+        if self.mode == "rich":
+            return RichAccessHandler()
+        if self.path:
+            handler = logging.FileHandler(self.path)
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonLinesFormatter())
+        return handler
+
+    def start(self):
+        if not self.enabled or self.listener is not None:
+            return
+        self.listener = QueueListener(self.queue, self.build_handler())
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+
+    def sampled(self, status: int) -> bool:
+        if status >= self.always_status or self.sample_rate >= 1:
+            return True
+        return random.random() < self.sample_rate
+
+    def emit(self, entry: Dict[str, Any]):
+        # nothing drains the queue before start(), e.g. with lifespan off
+        if self.listener is None:
+            return
+        self.logger.info("access", extra={"access": entry})
+
+
+class AccessLogMiddleware:
+    """
+    pure ASGI access-log middleware. only the response status and size are
+    observed, request and response bodies are never read or buffered.
+    """
+
+    def __init__(self, app: ASGIApp, access_log: AccessLog):
+        self.app = app
+        self.access_log = access_log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.access_log.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self.access_log.sampled(status):
+                self.log(scope, status, sent, time.perf_counter() - start)
+
+    def log(self, scope: Scope, status: int, sent: int, elapsed: float):
+        user_agent = referer = None
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif name == b"referer":
+                referer = value.decode("latin-1")
+        client = scope.get("client")
+        self.access_log.emit(
+            {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "bytes": sent,
+                "client": client[0] if client else None,
+                "user_agent": user_agent,
+                "referer": referer,
+            }
         )
-    )
 
-    console.print(Panel.fit(table, title="Request Details", border_style="cyan"))
 
-    if query_panel:
-        console.print(query_panel)
-
-    console.print(Panel.fit(formatted_headers, title="Headers", border_style="yellow"))
-
-    console.print(Panel.fit(formatted_body, title="Request Body", border_style="green"))
-
-    return response
+access_log = AccessLog()
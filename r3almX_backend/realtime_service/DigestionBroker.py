@@ -1,42 +1,91 @@
 import asyncio
 import datetime
+import time
+from collections import defaultdict, deque
 from typing import Never
-import uuid
 
-from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
 
-from r3almX_backend.chat_service.channel_system.channel_utils import get_message_model
-from r3almX_backend.database import AsyncSession
+from r3almX_backend.chat_service.channel_system.channel_utils import (
+    consolidated_storage,
+    resolve_message_model,
+    room_scope,
+)
+from r3almX_backend.database import AsyncSession, SessionLocal
+from r3almX_backend.database.ids import uuid7
+from r3almX_backend.realtime_service.message_spool import MessageSpool
+from r3almX_backend.realtime_service.metrics import (
+    digest_batch_size,
+    digest_failed,
+    digest_flush_seconds,
+)
+
+# errors that belong to a row, not to the database being unreachable
+ROW_ERRORS = (IntegrityError, DataError)
+# the latest rows that ran out of retries, kept for inspection
+FAILED_MESSAGES_LIMIT = 1000
 
 
 class DigestionBroker:
-    def __init__(self, batch_size: int = 10, flush_interval: int = 5):
+    COLUMNS = ("id", "channel_id", "sender_id", "message", "timestamp")
+
+    def __init__(
+        self,
+        batch_size: int = 10,
+        flush_interval: int = 5,
+        copy_threshold: int = 500,
+        max_retries: int = 3,
+        spool: MessageSpool | None = None,
+    ):
         self.batch_size = batch_size
         self.flush_interval = flush_interval
+        # groups at least this large are written with COPY instead of INSERT
+        self.copy_threshold = copy_threshold
+        self.max_retries = max_retries
+        # write-ahead log, messages are durable before add_message returns
+        self.spool = spool
         self.message_batch = []
-        self.lock = asyncio.Lock()
+        # rows that ran out of retries, the spool keeps them in its dead letters
+        self.failed_messages: deque = deque(maxlen=FAILED_MESSAGES_LIMIT)
+        self.lock = asyncio.Lock()  # guards message_batch only
+        self.db_lock = asyncio.Lock()  # serializes use of the shared session
         self.db: AsyncSession | None = None  # Initialize db as None initially
         self.flush_task: asyncio.Task | Never | None = None  # Initialize flush task as None
 
-    async def delete_message(self, message_id):
+    async def delete_message(self, message_id: str, room_id: str | None = None):
+        """
+        message_id is the mid clients received. a message still waiting in the
+        batch is dropped from it (and from the spool, so a replay does not
+        bring it back); the stored row is deleted by primary key, which needs
+        the room when the message has already been flushed.
+        """
         if self.db is None:
             raise ValueError("Database session (db) is not set. Call set_db(db) first.")
+        message_id = str(message_id)
         try:
             async with self.lock:
-                table_name = None
                 for msg in self.message_batch:
                     if msg["id"] == message_id:
-                        table_name = msg["room_id"]
+                        room_id = msg["room_id"]
                         self.message_batch.remove(msg)
                         break
-                if table_name is not None:
-                    table = get_message_model(table_name)
-                    stmt = table.delete().where(table.c.id == message_id)
-                    await self.db.execute(stmt)
-                    await self.db.commit()
-                    print(f"Deleted message with id {message_id} from batch and DB\n")
-                else:
-                    print(f"Message with id {message_id} not found in batch\n")
+            if self.spool is not None:
+                await self.spool.ack([message_id])
+            if room_id is None:
+                print(f"Message with id {message_id} not found in batch\n")
+                return
+            # a flush may have taken it out of the batch already
+            async with self.db_lock:
+                model = resolve_message_model(room_id)
+                stmt = (
+                    model.__table__.delete()
+                    .where(model.id == message_id)
+                    .where(*room_scope(model, room_id))
+                )
+                await self.db.execute(stmt)
+                await self.db.commit()
+            print(f"Deleted message with id {message_id}\n")
         except Exception as e:
             print(f"Exception occurred in delete_message: {e}")
 
@@ -54,20 +103,28 @@ class DigestionBroker:
     async def add_message(self, user_id, message):
         """
         - implement a retry method for the message committing
+
+        spool errors are raised to the caller: a message that could not be
+        made durable must not be published either.
         """
         if self.db is None:
             raise ValueError("Database session (db) is not set. Call set_db(db) first.")
+        # the id minted at ingress, so the stored row matches what clients saw
+        msg_id = message.get("mid") or str(uuid7())
+        msg_data = {
+            "id": msg_id,
+            "channel_id": message["channel_id"],
+            "sender_id": user_id,
+            "message": message["message"],
+            "room_id": message["room_id"],
+            "timestamp": self.parse_timestamp(message["timestamp"])
+            or datetime.datetime.now(),
+            "attempts": 0,
+        }
+        if self.spool is not None:
+            await self.spool.append(msg_data)
         try:
             async with self.lock:
-                msg_id = str(uuid.uuid4())
-                msg_data = {
-                    "id": msg_id,
-                    "channel_id": message["channel_id"],
-                    "sender_id": user_id,
-                    "message": message["message"],
-                    "room_id": message["room_id"],
-                    "timestamp": self.parse_timestamp(message["timestamp"]),
-                }
                 self.message_batch.append(msg_data)
                 if len(self.message_batch) >= self.batch_size:
                     if self.flush_task is None or self.flush_task.done():
@@ -79,42 +136,186 @@ class DigestionBroker:
         self.db = db
 
     async def flush_to_db(self):
-        if not self.message_batch:
-            return
-
+        # swap the batch out so add_message never waits on the database
         async with self.lock:
+            if not self.message_batch:
+                return
+            batch, self.message_batch = self.message_batch, []
+
+        # per-room tables get one statement each, consolidated storage
+        # writes the whole batch in one statement
+        grouped: dict[str, list] = defaultdict(list)
+        for msg in batch:
+            grouped["" if consolidated_storage() else msg["room_id"]].append(msg)
+
+        failed = []
+        started = time.perf_counter()
+        async with self.db_lock:
+            # replayed spool rows can be due before any socket called set_db
+            if self.db is None:
+                self.db = SessionLocal()
+            unreachable = None
+            for room_id, rows in grouped.items():
+                if unreachable is not None:
+                    # no point in trying the other tables during an outage
+                    failed.extend(self.mark_retryable(rows, unreachable))
+                    continue
+                try:
+                    room_failed = await self.write_room_batch(room_id, rows)
+                except Exception as e:
+                    print(f"Writing {len(rows)} messages failed: {e}\n")
+                    room_failed = self.mark_retryable(rows, e)
+                failed.extend(room_failed)
+                if room_failed and room_failed[-1].get("retryable"):
+                    unreachable = room_failed[-1]["error"]
+
+        if self.spool is not None:
+            failed_ids = {msg["id"] for msg in failed}
+            await self.spool.ack([m["id"] for m in batch if m["id"] not in failed_ids])
+
+        elapsed = time.perf_counter() - started
+        digest_batch_size.observe(len(batch))
+        digest_flush_seconds.observe(elapsed)
+        print(
+            f"Flushed {len(batch) - len(failed)}/{len(batch)} messages "
+            f"across {len(grouped)} tables in {elapsed:.3f}s\n"
+        )
+        if failed:
+            digest_failed.inc(len(failed))
+            await self.requeue(failed)
+
+    def columns(self, table) -> tuple:
+        if "room_id" in table.c:
+            return self.COLUMNS + ("room_id",)
+        return self.COLUMNS
+
+    def row_values(self, msg, columns) -> dict:
+        return {column: msg[column] for column in columns}
+
+    async def write_room_batch(self, room_id: str, rows: list) -> list:
+        """
+        write every row bound for messages_{room_id} (or the consolidated
+        messages table when room_id is empty) in one round trip.
+        returns the rows that could not be written.
+        """
+        table = resolve_message_model(room_id).__table__
+        columns = self.columns(table)
+        # replayed spool entries may already be stored, skip them by key
+        stmt = insert(table).on_conflict_do_nothing(
+            index_elements=[column.name for column in table.primary_key]
+        )
+
+        if len(rows) >= self.copy_threshold and self.supports_copy():
             try:
-                for msg in self.message_batch:
-                    try:
-                        print(f"\n\n\n{msg}\n\n\n")
-                        table_name = f"{msg['room_id']}"
-                        table = get_message_model(table_name)
-                        stmt = insert(table).values(
-                            id=msg["id"],
-                            sender_id=msg["sender_id"],
-                            channel_id=msg["channel_id"],
-                            message=msg["message"],
-                            timestamp=msg["timestamp"],
-                        )
-                        print(f"Executing statement: {stmt}")
-                        await self.db.execute(stmt)
-                    except Exception:
-                        pass
+                await self.copy_rows(table, columns, rows)
                 await self.db.commit()
-                print(f"Flushed {len(self.message_batch)} messages to DB\n")
-                self.message_batch.clear()
+                return []
             except Exception as e:
-                print(f"Exception occurred in flush db: {e}")
+                # COPY has no ON CONFLICT, fall back to the insert path
                 await self.db.rollback()
+                print(f"COPY into {table.name} failed, using INSERT: {e}\n")
+
+        try:
+            # executemany: rendered as multi-row INSERT ... VALUES batches
+            await self.db.execute(stmt, [self.row_values(m, columns) for m in rows])
+            await self.db.commit()
+            return []
+        except ROW_ERRORS as e:
+            await self.rollback()
+            print(f"Batch insert into {table.name} failed, isolating rows: {e}\n")
+        except Exception as e:
+            # the database itself is the problem, row by row would only
+            # repeat the failure once per row
+            await self.rollback()
+            print(f"Batch insert into {table.name} failed, requeueing it: {e}\n")
+            return self.mark_retryable(rows, e)
+
+        # only reached on a data error: find the offending rows so the rest land
+        failed = []
+        for index, msg in enumerate(rows):
+            try:
+                await self.db.execute(stmt.values(**self.row_values(msg, columns)))
+                await self.db.commit()
+            except ROW_ERRORS as e:
+                await self.rollback()
+                msg["error"] = str(e)
+                failed.append(msg)
+            except Exception as e:
+                await self.rollback()
+                return failed + self.mark_retryable(rows[index:], e)
+        return failed
+
+    @staticmethod
+    def mark_retryable(rows: list, error: Exception | str) -> list:
+        """rows that failed for reasons of their own count an attempt, these do not"""
+        for msg in rows:
+            msg["error"] = str(error)
+            msg["retryable"] = True
+        return rows
+
+    async def rollback(self):
+        try:
+            await self.db.rollback()
+        except Exception as e:
+            print(f"Rollback failed: {e}\n")
+
+    def supports_copy(self) -> bool:
+        return self.db.bind is not None and self.db.bind.dialect.driver == "asyncpg"
+
+    async def copy_rows(self, table, columns: tuple, rows: list):
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            records=[tuple(msg[column] for column in columns) for msg in rows],
+            columns=list(columns),
+        )
+
+    async def requeue(self, failed: list):
+        retry = []
+        dead = []
+        for msg in failed:
+            if msg.pop("retryable", False):
+                # the database was unreachable, the row itself is fine
+                retry.append(msg)
+                continue
+            msg["attempts"] += 1
+            if msg["attempts"] < self.max_retries:
+                retry.append(msg)
+            else:
+                dead.append(msg)
+            print(
+                f"Failed to store message {msg['id']} in room {msg['room_id']} "
+                f"(attempt {msg['attempts']}/{self.max_retries}): {msg.get('error')}\n"
+            )
+        if dead:
+            self.failed_messages.extend(dead)
+            if self.spool is not None:
+                # out of the replay set, into the dead letters
+                await self.spool.dead_letter(dead)
+        if retry:
+            async with self.lock:
+                # retries go first so they keep their order relative to new rows
+                self.message_batch[:0] = retry
+
+    async def recover_spool(self):
+        """replay messages a crashed worker accepted but never flushed"""
+        if self.spool is None:
+            return
+        recovered = await self.spool.recover()
+        if recovered:
+            async with self.lock:
+                self.message_batch[:0] = recovered
 
     async def start_flush_scheduler(self):
         try:
-            while True:
-                await asyncio.sleep(self.flush_interval)
-                await self.flush_to_db()
+            await self.recover_spool()
         except Exception as e:
-            print(f"Error in start_flush_scheduler: {e}")
+            print(f"Error recovering the spool: {e}")
+        # one failed pass must not end the timed flushes for good
+        while True:
             await asyncio.sleep(self.flush_interval)
-            await self.flush_to_db()
-        except Exception as e:
-            print(f"Error in start_flush_scheduler: {e}")
+            try:
+                await self.flush_to_db()
+            except Exception as e:
+                print(f"Error in start_flush_scheduler: {e}")
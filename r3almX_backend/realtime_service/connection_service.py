@@ -1,90 +1,261 @@
 import asyncio
-import datetime
-from typing import Dict
+import json
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
 
-import redis
+import redis.asyncio as redis
 from fastapi import Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
-from jose import JWTError, jwt
+from pydantic import BaseModel
 
-from r3almX_backend.auth_service.Config import UsersConfig
-from r3almX_backend.auth_service.user_handler_utils import get_db, get_user_by_email
+from r3almX_backend.auth_service.auth_utils import get_current_user
+from r3almX_backend.auth_service.token_auth import get_user_from_token
+from r3almX_backend.auth_service.user_handler_utils import get_db
 from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.chat_service.room_service.membership import (
+    is_member,
+    member_ids,
+)
+from r3almX_backend.chat_service.room_service.room_list_cache import (
+    room_member_cache,
+)
+from r3almX_backend.database import SessionLocal
+from r3almX_backend.friends_service.friendships import friend_ids
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+from r3almX_backend.realtime_service.heartbeat_wheel import HeartbeatWheel
 from r3almX_backend.realtime_service.main import realtime
+from r3almX_backend.realtime_service.presence_hub import (
+    MAX_WATCHED_USERS,
+    PRESENCE_CHANNEL,
+    PresenceHub,
+)
+
+# go offline only if this worker still owns the route, the user may already
+# have reconnected on another worker. KEYS: presence, route; ARGV: worker id,
+# presence channel, offline payload
+RELEASE_ROUTE = """
+local owner = redis.call('get', KEYS[2])
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[1], KEYS[2])
+redis.call('publish', ARGV[2], ARGV[3])
+return 1
+"""
+
+# decrement one unread counter without going below zero, -1 clears it
+ACK_UNREAD = """
+local current = tonumber(redis.call('hget', KEYS[1], ARGV[1]) or '0')
+local count = tonumber(ARGV[2])
+if count < 0 or count >= current then
+    redis.call('hdel', KEYS[1], ARGV[1])
+    return 0
+end
+return redis.call('hincrby', KEYS[1], ARGV[1], -count)
+"""
 
 
-async def get_user_from_token(token: str, db) -> User:
-    try:
-        payload: dict = jwt.decode(
-            token, UsersConfig.SECRET_KEY, algorithms=[UsersConfig.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        user = await get_user_by_email(db, email=email)
-        return user
-    except JWTError as j:
-        return j
+class Connection:
+    """
+    presence for users connected to this worker.
 
+    each online user has their own presence:{user_id} key holding the status,
+    written with a TTL. the worker refreshes the keys of its connected users
+    every PRESENCE_HEARTBEAT seconds (see HeartbeatWheel), so when a worker dies
+    its users drop to offline on their own once the TTL runs out. a missing
+    key means offline.
+
+    route:{user_id} records which worker holds the user's /connection socket,
+    with the same TTL. notifications for users on another worker are
+    published on that worker's notify:{worker_id} channel.
+    """
 
-class Connection:
     def __init__(self):
         self.redis_client = redis.Redis().from_url(
-            url="redis://redis:6379", decode_responses=True, db=0
+            url=RealtimeConfig.REDIS_URL, decode_responses=True, db=0
         )
         self.connection_status_cache: Dict[str, str] = {}
         self.connection_sockets: Dict[str, WebSocket] = {}
-
-    def connect(self, user_id):
+        self.presence_ttl = RealtimeConfig.PRESENCE_TTL
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.router_task: asyncio.Task | None = None
+        self.undelivered: Callable[[str, Any], Awaitable[None]] | None = None
+
+    @staticmethod
+    def presence_key(user_id) -> str:
+        return f"presence:{user_id}"
+
+    @staticmethod
+    def route_key(user_id) -> str:
+        return f"route:{user_id}"
+
+    @staticmethod
+    def notify_channel(worker_id: str) -> str:
+        return f"notify:{worker_id}"
+
+    async def connect(self, user_id):
+        user_id = str(user_id)
+        # listen before claiming the route so nothing sent to us is missed
+        await self.start_router()
         self.connection_status_cache[user_id] = "online"
-        self.set_status_cache(user_id, "online")
+        # one MULTI, so a disconnect elsewhere sees the old route or the new one
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(self.presence_key(user_id), "online", ex=self.presence_ttl)
+            pipe.set(self.route_key(user_id), self.worker_id, ex=self.presence_ttl)
+            pipe.publish(PRESENCE_CHANNEL, json.dumps({user_id: "online"}))
+            await pipe.execute()
 
     async def disconnect(self, user_id):
         print("offline was called")
-        if user_id in self.connection_status_cache:
-            del self.connection_status_cache[user_id]
-        if user_id in self.connection_sockets:
-            del self.connection_sockets[user_id]
-        self.set_status_cache(user_id, "offline")
+        user_id = str(user_id)
+        self.connection_status_cache.pop(user_id, None)
+        self.connection_sockets.pop(user_id, None)
+        await self.redis_client.eval(
+            RELEASE_ROUTE,
+            2,
+            self.presence_key(user_id),
+            self.route_key(user_id),
+            self.worker_id,
+            PRESENCE_CHANNEL,
+            json.dumps({user_id: "offline"}),
+        )
+
+    async def start_router(self):
+        if self.router_task is not None and not self.router_task.done():
+            return
+        pubsub = self.redis_client.pubsub()
+        await pubsub.subscribe(self.notify_channel(self.worker_id))
+        self.router_task = asyncio.create_task(self.route_incoming(pubsub))
+
+    def on_undelivered(self, callback: Callable[[str, Any], Awaitable[None]]):
+        """callback(user_id, message) runs for routed notifications with no socket"""
+        self.undelivered = callback
 
-    def get_status_cache(self, user_id) -> Dict[str, str]:
-        cached_status = self.redis_client.hgetall("user_status")
-        return {user_id: status for user_id, status in cached_status.items()}
+    async def route_incoming(self, pubsub):
+        """deliver notifications other workers routed to this one"""
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    await self.route_one(json.loads(message["data"]))
+                except Exception as e:
+                    print(f"routed notification dropped: {e}")
+        except Exception as e:
+            print(f"notification router stopped: {e}")
+        finally:
+            await pubsub.aclose()
+
+    async def route_one(self, data: dict):
+        # a room notification carries every recipient on this worker at once
+        for user_id in data.get("user_ids") or [data["user_id"]]:
+            # the sender counted the publish as delivered, the fallback is ours
+            if await self.deliver_local(user_id, data["message"]):
+                continue
+            print(f"routed notification for {user_id} had no socket")
+            if self.undelivered is not None:
+                await self.undelivered(user_id, data["message"])
+
+    async def refresh(self, statuses: Iterable[tuple[str, str]]):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for user_id, status in tuple(statuses):
+                pipe.set(self.presence_key(user_id), status, ex=self.presence_ttl)
+                if user_id in self.connection_sockets:
+                    pipe.set(
+                        self.route_key(user_id), self.worker_id, ex=self.presence_ttl
+                    )
+            await pipe.execute()
+
+    async def get_status_cache(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        """statuses for a set of users in one MGET, missing keys are offline"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return {}
+        statuses = await self.redis_client.mget(
+            [self.presence_key(user_id) for user_id in user_ids]
+        )
+        return {
+            user_id: status or "offline"
+            for user_id, status in zip(user_ids, statuses)
+        }
 
-    def get_user_status(self, user_id) -> str:
-        cached_status = self.redis_client.hget("user_status")
-        return cached_status.value
+    async def get_user_status(self, user_id) -> str:
+        status = await self.redis_client.get(self.presence_key(user_id))
+        return status or "offline"
 
     def set_dnd(self, user_id):
         # class C: integer notif push (silent number increment)
         pass
 
     def is_connected(self, user_id) -> bool:
+        user_id = str(user_id)
         return (
             user_id in self.connection_status_cache
             or user_id in self.connection_sockets
         )
 
-    def get_status(self, user_id) -> str:
-        return self.connection_status_cache.get(user_id, "online")
+    async def get_status(self, user_id) -> str:
+        # local connections answer without a round trip
+        status = self.connection_status_cache.get(str(user_id))
+        if status is not None:
+            return status
+        return await self.get_user_status(user_id)
 
-    def set_status(self, user_id, status):
+    async def set_status(self, user_id, status):
         if status in ["online", "offline", "dnd"]:
-            self.connection_status_cache[user_id] = status
-            self.set_status_cache(user_id, status)
+            self.connection_status_cache[str(user_id)] = status
+            await self.set_status_cache(user_id, status)
             # getattr(self, f"set_{status}")(user_id)
 
-    def set_status_cache(self, user_id, status):
-        self.redis_client.hset("user_status", str(user_id), status)
-
-    async def send_notification(self, user_id, message):
-        websocket = self.connection_sockets.get(user_id)
-        if websocket:
-            await websocket.send_json({"sender": str(user_id), "message": message})
+    async def set_status_cache(self, user_id, status):
+        # subscribers (see PresenceHub) learn about the change in the same trip
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(self.presence_key(user_id), status, ex=self.presence_ttl)
+            pipe.publish(PRESENCE_CHANNEL, json.dumps({str(user_id): status}))
+            await pipe.execute()
+
+    async def deliver_local(self, user_id, message) -> bool:
+        websocket = self.connection_sockets.get(str(user_id))
+        if websocket is None:
+            return False
+        await websocket.send_json({"sender": str(user_id), "message": message})
+        return True
+
+    async def send_notification(self, user_id, message) -> bool:
+        """
+        deliver to the user's socket on whichever worker holds it. True once
+        the message is handed to a worker: a worker that finds no socket
+        passes it to the on_undelivered callback instead of dropping it.
+        """
+        user_id = str(user_id)
+        if await self.deliver_local(user_id, message):
+            return True
+        worker_id = await self.redis_client.get(self.route_key(user_id))
+        if worker_id is None or worker_id == self.worker_id:
+            return False
+        receivers = await self.redis_client.publish(
+            self.notify_channel(worker_id),
+            json.dumps({"user_id": user_id, "message": message}, default=str),
+        )
+        return receivers > 0
 
 
 connection_manager = Connection()
+presence_hub = PresenceHub(connection_manager)
+heartbeat_wheel = HeartbeatWheel(connection_manager)
 
 
 class NotificationSystem:
+    """
+    notifications for users that are offline go to their inbox instead of
+    being dropped: inbox:{user_id} is a list capped at INBOX_SIZE and
+    unread:{user_id} holds an unread count per room. both are written in one
+    MULTI, and a reconnecting user gets the whole inbox in one round trip.
+    room posts skip the inbox and only bump the unread count, see notify_room.
+    """
+
     def __init__(self):
         self.types = {
             1: "RoomPost",
@@ -93,24 +264,115 @@ class NotificationSystem:
             4: "DM",
         }
         self.connections = connection_manager
+        self.connections.on_undelivered(self.store_offline)
 
     def return_user(self, user_id):
         return self.connections.connection_cache_list.get(user_id)
 
-    async def send_notification_to_user(self, user_id, message):
-        await self.connections.send_notification(user_id, message)
+    @staticmethod
+    def inbox_key(user_id) -> str:
+        return f"inbox:{user_id}"
+
+    @staticmethod
+    def unread_key(user_id) -> str:
+        return f"unread:{user_id}"
+
+    async def send_notification_to_user(self, user_id, message) -> bool:
+        if await self.connections.send_notification(user_id, message):
+            return True
+        await self.store_offline(user_id, message)
+        return False
+
+    async def room_recipients(self, room_id: str) -> List[str]:
+        """the room's member ids from the member cache, the db only on a miss"""
+        members, version = await room_member_cache.read(room_id)
+        if members is None:
+            # a session of its own, never the one of the calling socket
+            async with SessionLocal() as db:
+                members = await room_member_cache.fill(db, room_id, version)
+        return members
+
+    async def notify_room(self, room_id: str, sender_id: str, notification: dict):
+        """
+        tell every member but the sender about a new room message. one MGET
+        finds who holds a /connection socket and where; members without one
+        get their unread counter for the room bumped, all in one pipeline,
+        and nothing in the inbox, which is kept for direct notifications.
+        members online elsewhere get one publish per worker.
+        """
+        recipients = [
+            member
+            for member in await self.room_recipients(room_id)
+            if member != sender_id
+        ]
+        if not recipients:
+            return
+        redis_client = self.connections.redis_client
+        routes = await redis_client.mget(
+            [self.connections.route_key(member) for member in recipients]
+        )
 
+        by_worker: Dict[str, List[str]] = {}
+        offline = []
+        for member, worker_id in zip(recipients, routes):
+            if worker_id is None:
+                offline.append(member)
+            else:
+                by_worker.setdefault(worker_id, []).append(member)
+
+        local = by_worker.pop(self.connections.worker_id, [])
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for member in offline:
+                pipe.hincrby(self.unread_key(member), room_id, 1)
+            for worker_id, members in by_worker.items():
+                pipe.publish(
+                    self.connections.notify_channel(worker_id),
+                    json.dumps(
+                        {"user_ids": members, "message": notification}, default=str
+                    ),
+                )
+            await pipe.execute()
+        for member in local:
+            if not await self.connections.deliver_local(member, notification):
+                await redis_client.hincrby(self.unread_key(member), room_id, 1)
+
+    async def store_offline(self, user_id, message):
+        room_id = "direct"
+        if isinstance(message, dict) and message.get("room_id"):
+            room_id = str(message["room_id"])
+        async with self.connections.redis_client.pipeline(transaction=True) as pipe:
+            pipe.lpush(self.inbox_key(user_id), json.dumps(message, default=str))
+            pipe.ltrim(self.inbox_key(user_id), 0, RealtimeConfig.INBOX_SIZE - 1)
+            pipe.hincrby(self.unread_key(user_id), room_id, 1)
+            await pipe.execute()
+
+    async def drain_inbox(self, user_id, websocket: WebSocket):
+        """hand the queued notifications and unread counters over in one frame"""
+        async with self.connections.redis_client.pipeline(transaction=True) as pipe:
+            pipe.lrange(self.inbox_key(user_id), 0, -1)
+            pipe.delete(self.inbox_key(user_id))
+            pipe.hgetall(self.unread_key(user_id))
+            queued, _, unread = await pipe.execute()
+        if not queued and not unread:
+            return
+        await websocket.send_json(
+            {
+                "type": "NOTIFICATION_BATCH",
+                # the list is newest first, the client wants arrival order
+                "notifications": [json.loads(item) for item in reversed(queued)],
+                "unread": {room_id: int(count) for room_id, count in unread.items()},
+            }
+        )
 
-async def send_periodic_status_update(websocket, user_id):
-    try:
-        while True:
-            await asyncio.sleep(30)  # Send update every 30 seconds
-            current_status = connection_manager.get_status(user_id)
-            await websocket.send_json(
-                {"type": "STATUS_UPDATE", "status": current_status}
-            )
-    except RuntimeError:
-        pass
+    async def get_unread(self, user_id) -> Dict[str, int]:
+        unread = await self.connections.redis_client.hgetall(self.unread_key(user_id))
+        return {room_id: int(count) for room_id, count in unread.items()}
+
+    async def ack(self, user_id, room_id: str, count: int = -1) -> int:
+        """mark count notifications of a room as read, returns what is left"""
+        return await self.connections.redis_client.eval(
+            ACK_UNREAD, 1, self.unread_key(user_id), room_id, count
+        )
 
 
 async def get_token_from_header(request: Request):
@@ -125,7 +387,7 @@ async def read_redis(request: Request, db=Depends(get_db)):
     try:
         user = await get_user_from_token(await get_token_from_header(request), db)
         print(user)
-        cached_data = connection_manager.get_status(user.id)
+        cached_data = await connection_manager.get_status(user.id)
         return JSONResponse(cached_data)
     except AttributeError as a:
         print(f"there is no status added: {a}")
@@ -135,58 +397,145 @@ async def read_redis(request: Request, db=Depends(get_db)):
 async def change_status(new_status: str, request: Request, db=Depends(get_db)):
     user = await get_user_from_token(await get_token_from_header(request), db)
     if user:
-        connection_manager.set_status(user.id, new_status)
+        await connection_manager.set_status(user.id, new_status)
         return JSONResponse({"status": "success", "new_status": new_status})
     return JSONResponse({"status": "error", "message": "Invalid user"}, status_code=400)
 
 
+class PresenceQuery(BaseModel):
+    user_ids: List[str] = []
+    room_id: str | None = None
+    friends: bool = False
+
+
+async def resolve_presence_ids(db, user: User, query: PresenceQuery) -> List[str]:
+    """explicit ids plus the members of a room and/or the user's friends"""
+    user_ids = list(query.user_ids)
+    if query.room_id:
+        if not await is_member(db, query.room_id, user.id):
+            raise HTTPException(status_code=404, detail="room not found")
+        # one past the cap is enough to reject an oversized room below
+        user_ids.extend(
+            await member_ids(db, query.room_id, limit=MAX_WATCHED_USERS + 1)
+        )
+    if query.friends:
+        user_ids.extend(
+            await friend_ids(db, user.id, limit=MAX_WATCHED_USERS + 1)
+        )
+    user_ids = list(dict.fromkeys(user_ids))
+    if len(user_ids) > MAX_WATCHED_USERS:
+        raise HTTPException(
+            status_code=400, detail=f"at most {MAX_WATCHED_USERS} users per query"
+        )
+    return user_ids
+
+
+@realtime.post("/status/bulk")
+async def bulk_status(
+    query: PresenceQuery,
+    user: User = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    user_ids = await resolve_presence_ids(db, user, query)
+    return {
+        "status": 200,
+        "presence": await connection_manager.get_status_cache(user_ids),
+    }
+
+
+@realtime.websocket("/status/subscribe")
+async def subscribe_status(websocket: WebSocket, token: str, db=Depends(get_db)):
+    """
+    send a PresenceQuery to (re)set the watch list; the reply is a full
+    PRESENCE_SNAPSHOT, followed by PRESENCE_DIFF frames as statuses change
+    """
+    user = await get_user_from_token(token, db)
+    if user is None:
+        return await websocket.close(1001)
+
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                query = PresenceQuery(**await websocket.receive_json())
+                user_ids = await resolve_presence_ids(db, user, query)
+            except HTTPException as e:
+                await websocket.send_json({"type": "ERROR", "detail": e.detail})
+                continue
+            except (TypeError, ValueError) as e:
+                await websocket.send_json({"type": "ERROR", "detail": str(e)})
+                continue
+            snapshot = await presence_hub.subscribe(websocket, user_ids)
+            await websocket.send_json({"type": "PRESENCE_SNAPSHOT", "presence": snapshot})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        presence_hub.unsubscribe(websocket)
+
+
+class NotificationAck(BaseModel):
+    room_id: str
+    # how many were read, -1 marks the whole room as read
+    count: int = -1
+
+
+@realtime.get("/notifications/unread")
+async def unread_notifications(user: User = Depends(get_current_user)):
+    return {
+        "status": 200,
+        "unread": await notification_system.get_unread(str(user.id)),
+    }
+
+
+@realtime.post("/notifications/ack")
+async def ack_notifications(
+    ack: NotificationAck, user: User = Depends(get_current_user)
+):
+    remaining = await notification_system.ack(str(user.id), ack.room_id, ack.count)
+    return {"status": 200, "room_id": ack.room_id, "unread": remaining}
+
+
 @realtime.websocket("/connection")
 async def connect(websocket: WebSocket, token: str, db=Depends(get_db)):
     user = await get_user_from_token(token, db)
     if user:
         await websocket.accept()
-        connection_manager.connect(str(user.id))
         connection_manager.connection_sockets[str(user.id)] = websocket
-        initial_status = connection_manager.get_status(user.id)
+        await connection_manager.connect(user.id)
+        initial_status = await connection_manager.get_status(user.id)
         await websocket.send_json({"type": "STATUS_UPDATE", "status": initial_status})
+        await notification_system.drain_inbox(str(user.id), websocket)
 
-        last_activity = datetime.datetime.now()
-        heartbeat_interval = 30
-        expiry_timeout = 100
-
+        # status pushes and idle expiry are driven by the heartbeat wheel,
+        # any frame from the client (a "pong" will do) counts as activity
+        heartbeat_wheel.register(str(user.id), websocket)
         try:
             while True:
-                asyncio.create_task(send_periodic_status_update(websocket, user.id))
                 await websocket.send_json(
                     {"status": "200", "connection": "established"}
                 )
+                if connection_manager.is_connected(user.id) is False:
+                    connection_manager.connection_sockets[str(user.id)] = websocket
+                    await connection_manager.set_status_cache(
+                        user.id, await connection_manager.get_status(user.id)
+                    )
+                frame = await websocket.receive_text()
+                heartbeat_wheel.touch(websocket)
                 try:
-                    if connection_manager.is_connected(user.id) is False:
-                        connection_manager.connection_sockets[str(user.id)] = websocket
-                        connection_manager.set_status_cache(
-                            user.id, connection_manager.get_status(user.id)
-                        )
-                    connection_change_request = await websocket.receive_json()
-                    if "status" in connection_change_request:
-                        connection_manager.set_status(
-                            user.id, connection_change_request["status"]
-                        )
-                except asyncio.TimeoutError:
-                    try:
-                        await websocket.send_text("ping")
-                        await asyncio.wait_for(
-                            websocket.receive_text(), timeout=heartbeat_interval / 2
-                        )
-                        last_activity = datetime.datetime.now()
-                    except (asyncio.TimeoutError, WebSocketDisconnect):
-                        if (
-                            datetime.datetime.now() - last_activity
-                        ).total_seconds() > expiry_timeout:
-                            print(f"disconnecting user: {user.id} ")
-                            await websocket.close()
-                            connection_manager.disconnect(user.id)
-                            break
+                    connection_change_request = json.loads(frame)
+                except ValueError:
+                    continue
+                if (
+                    isinstance(connection_change_request, dict)
+                    and "status" in connection_change_request
+                ):
+                    await connection_manager.set_status(
+                        user.id, connection_change_request["status"]
+                    )
         except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            heartbeat_wheel.unregister(websocket)
             await connection_manager.disconnect(user.id)
     else:
         return await websocket.close(1001)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable
+
+from fastapi import WebSocket
+
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+from r3almX_backend.realtime_service.metrics import (
+    fanout_dropped,
+    fanout_evicted,
+    fanout_latency,
+    messages_out,
+)
+
+
+class Outbox:
+    """bounded outbound queue and writer task for a single websocket"""
+
+    __slots__ = ("websocket", "room_id", "queue", "task", "dropped")
+
+    def __init__(self, websocket: WebSocket, room_id: str, maxsize: int):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.task: asyncio.Task | None = None
+        self.dropped = 0
+
+
+class RoomLatency:
+    """running fan-out latency figures for one room, in seconds"""
+
+    __slots__ = ("count", "total", "max", "ewma")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.ewma = 0.0
+
+    def observe(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.ewma = elapsed if self.count == 1 else self.ewma * 0.9 + elapsed * 0.1
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": (self.total / self.count) * 1000 if self.count else 0.0,
+            "ewma_ms": self.ewma * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class FanoutEngine:
+    """
+    delivers room messages to websockets without letting one client hold up
+    the rest of the room.
+
+    a payload is serialized once per message and the same frame is queued on
+    every recipient's outbox; each socket has its own writer task so sends
+    run concurrently. when an outbox is full the consumer is considered
+    lagging and is either disconnected or has its backlog dropped.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = RealtimeConfig.FANOUT_QUEUE_SIZE,
+        overflow: str = RealtimeConfig.FANOUT_OVERFLOW,
+        send_timeout: float = RealtimeConfig.FANOUT_SEND_TIMEOUT,
+    ):
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.send_timeout = send_timeout
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        self.latency: Dict[str, RoomLatency] = {}
+        self.evicted = 0
+
+    def register(self, room_id: str, websocket: WebSocket):
+        if websocket in self.outboxes:
+            return
+        outbox = Outbox(websocket, room_id, self.queue_size)
+        outbox.task = asyncio.create_task(self.writer(outbox))
+        self.outboxes[websocket] = outbox
+
+    async def unregister(self, websocket: WebSocket):
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox is None or outbox.task is None:
+            return
+        outbox.task.cancel()
+        try:
+            await outbox.task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    def forget_room(self, room_id: str):
+        self.latency.pop(room_id, None)
+
+    def publish(self, room_id: str, websockets: Iterable[WebSocket], payload: Any):
+        """serialize once and enqueue for every socket, never awaits a send"""
+        # same encoding as WebSocket.send_json so clients see identical frames
+        frame = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        enqueued_at = time.perf_counter()
+
+        queued = 0
+        for websocket in tuple(websockets):
+            outbox = self.outboxes.get(websocket)
+            if outbox is None:
+                continue
+            queued += 1
+            try:
+                outbox.queue.put_nowait((frame, enqueued_at))
+            except asyncio.QueueFull:
+                self.handle_overflow(outbox, frame, enqueued_at)
+        messages_out.inc(queued)
+
+    def handle_overflow(self, outbox: Outbox, frame: str, enqueued_at: float):
+        if self.overflow == "drop_oldest":
+            try:
+                outbox.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            outbox.dropped += 1
+            fanout_dropped.inc()
+            outbox.queue.put_nowait((frame, enqueued_at))
+            return
+
+        print(f"Disconnecting lagging consumer in room {outbox.room_id}\n")
+        self.evicted += 1
+        fanout_evicted.inc()
+        self.outboxes.pop(outbox.websocket, None)
+        asyncio.create_task(self.evict(outbox))
+
+    async def evict(self, outbox: Outbox):
+        if outbox.task is not None:
+            outbox.task.cancel()
+        try:
+            # 1013: try again later, the client can reconnect and resync
+            await asyncio.wait_for(
+                outbox.websocket.close(code=1013), timeout=self.send_timeout
+            )
+        except Exception as e:
+            print(f"Failed to close lagging socket in room {outbox.room_id}: {e}\n")
+
+    async def writer(self, outbox: Outbox):
+        websocket = outbox.websocket
+        while True:
+            frame, enqueued_at = await outbox.queue.get()
+            try:
+                await asyncio.wait_for(
+                    websocket.send_text(frame), timeout=self.send_timeout
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # the receive loop owns the disconnect, stop writing to it
+                print(f"Send failed in room {outbox.room_id}: {e}\n")
+                self.outboxes.pop(websocket, None)
+                return
+            elapsed = time.perf_counter() - enqueued_at
+            self.latency.setdefault(outbox.room_id, RoomLatency()).observe(elapsed)
+            fanout_latency.observe(elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sockets": len(self.outboxes),
+            "evicted": self.evicted,
+            "dropped": sum(outbox.dropped for outbox in self.outboxes.values()),
+            "rooms": {
+                room_id: latency.to_dict()
+                for room_id, latency in self.latency.items()
+            },
+        }
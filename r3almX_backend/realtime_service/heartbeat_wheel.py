@@ -0,0 +1,136 @@
+import asyncio
+from typing import Dict, List
+
+from fastapi import WebSocket
+
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+
+
+class ConnectionState:
+    """what the wheel needs to know about one /connection socket"""
+
+    __slots__ = ("user_id", "websocket", "last_seen", "slot")
+
+    def __init__(self, user_id: str, websocket: WebSocket, last_seen: float, slot: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.last_seen = last_seen
+        self.slot = slot
+
+
+class HeartbeatWheel:
+    """
+    one timer for every /connection socket on this worker.
+
+    a hashed timing wheel with interval / tick slots; each socket sits in the
+    slot of its next beat. a single task advances one slot per tick and beats
+    everything in it: the presence keys are refreshed in one pipeline, a
+    STATUS_UPDATE is pushed, and sockets that have not sent anything for
+    idle_timeout are closed. the receive loop of the endpoint owns the
+    disconnect, the wheel only touches and closes.
+    """
+
+    def __init__(
+        self,
+        connection,
+        interval: float = RealtimeConfig.PRESENCE_HEARTBEAT,
+        tick: float = RealtimeConfig.HEARTBEAT_TICK,
+        idle_timeout: float = RealtimeConfig.CONNECTION_IDLE_TIMEOUT,
+        send_timeout: float = RealtimeConfig.FANOUT_SEND_TIMEOUT,
+    ):
+        self.connection = connection
+        self.tick = tick
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.slots: List[Dict[WebSocket, ConnectionState]] = [
+            {} for _ in range(max(1, round(interval / tick)))
+        ]
+        self.cursor = 0
+        self.states: Dict[WebSocket, ConnectionState] = {}
+        self.task: asyncio.Task | None = None
+
+    def register(self, user_id: str, websocket: WebSocket):
+        # the cursor's slot is not visited again for a full interval
+        slot = self.cursor
+        state = ConnectionState(
+            user_id, websocket, asyncio.get_running_loop().time(), slot
+        )
+        self.states[websocket] = state
+        self.slots[slot][websocket] = state
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def unregister(self, websocket: WebSocket):
+        state = self.states.pop(websocket, None)
+        if state is not None:
+            self.slots[state.slot].pop(websocket, None)
+
+    def touch(self, websocket: WebSocket):
+        state = self.states.get(websocket)
+        if state is not None:
+            state.last_seen = asyncio.get_running_loop().time()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while self.states:
+            deadline += self.tick
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            due = self.slots[self.cursor]
+            self.slots[self.cursor] = {}
+            if not due:
+                continue
+            try:
+                await self.beat(list(due.values()))
+            except Exception as e:
+                print(f"heartbeat tick failed: {e}")
+
+    async def beat(self, due: List[ConnectionState]):
+        now = asyncio.get_running_loop().time()
+        alive: List[ConnectionState] = []
+        expired: List[ConnectionState] = []
+        for state in due:
+            if self.states.get(state.websocket) is not state:
+                continue  # unregistered while the slot was being processed
+            if now - state.last_seen > self.idle_timeout:
+                expired.append(state)
+                continue
+            alive.append(state)
+            state.slot = self.cursor
+            self.slots[self.cursor][state.websocket] = state
+
+        statuses = self.connection.connection_status_cache
+        if alive:
+            # a redis hiccup must not stop the pushes and the idle expiry
+            try:
+                await self.connection.refresh(
+                    (state.user_id, statuses.get(state.user_id, "online"))
+                    for state in alive
+                )
+            except Exception as e:
+                print(f"presence refresh failed for {len(alive)} users: {e}")
+        await asyncio.gather(
+            *(
+                self.send(state, statuses.get(state.user_id, "online"))
+                for state in alive
+            ),
+            *(self.expire(state) for state in expired),
+        )
+
+    async def send(self, state: ConnectionState, status: str):
+        try:
+            await asyncio.wait_for(
+                state.websocket.send_json({"type": "STATUS_UPDATE", "status": status}),
+                timeout=self.send_timeout,
+            )
+        except Exception as e:
+            print(f"heartbeat to {state.user_id} failed: {e}")
+
+    async def expire(self, state: ConnectionState):
+        print(f"disconnecting user: {state.user_id} ")
+        self.unregister(state.websocket)
+        try:
+            await asyncio.wait_for(state.websocket.close(), timeout=self.send_timeout)
+        except Exception as e:
+            print(f"closing idle socket of {state.user_id} failed: {e}")
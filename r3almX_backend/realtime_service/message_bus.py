@@ -0,0 +1,270 @@
+import abc
+import asyncio
+import json
+import sys
+import traceback
+from typing import Any, Awaitable, Callable, Dict
+
+import aio_pika
+import redis.asyncio as redis
+
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Global variable to store the RabbitMQ connection
+rabbit_connection = None
+
+
+async def get_rabbit_connection():
+    global rabbit_connection
+
+    # If the connection is None or closed, create a new connection
+    if not rabbit_connection or rabbit_connection.is_closed:
+        rabbit_connection = await aio_pika.connect_robust(RealtimeConfig.RABBITMQ_URL)
+    return rabbit_connection
+
+
+class MessageBus(abc.ABC):
+    """
+    room-addressed publish/subscribe between the workers of a deployment.
+
+    publish() sends a message to every worker subscribed to its room,
+    including this one; subscribed messages are handed to the handler given
+    at construction. subscribe/unsubscribe follow the first and last local
+    socket of a room.
+    """
+
+    name = "abstract"
+
+    def __init__(self, handler: MessageHandler):
+        self.handler = handler
+        self.rooms: set = set()
+
+    @abc.abstractmethod
+    async def subscribe(self, room_id: str): ...
+
+    @abc.abstractmethod
+    async def unsubscribe(self, room_id: str): ...
+
+    @abc.abstractmethod
+    async def publish(self, room_id: str, message: Dict[str, Any]): ...
+
+    async def dispatch(self, message: Dict[str, Any]):
+        try:
+            await self.handler(message)
+        except Exception as e:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            print(f"Error dispatching message for room {message.get('room_id')}: {e}\n")
+            traceback.print_exception(
+                exc_type, exc_value, exc_traceback, file=sys.stdout
+            )
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "rooms": len(self.rooms)}
+
+
+class InProcessBus(MessageBus):
+    """
+    single-worker deployments and tests: publish hands the message straight
+    to the local handler, no broker hop and no serialization
+    """
+
+    name = "inprocess"
+
+    async def subscribe(self, room_id: str):
+        self.rooms.add(room_id)
+
+    async def unsubscribe(self, room_id: str):
+        self.rooms.discard(room_id)
+
+    async def publish(self, room_id: str, message: Dict[str, Any]):
+        if room_id in self.rooms:
+            await self.dispatch(message)
+
+
+class RabbitMQBus(MessageBus):
+    """
+    one channel and one exclusive, server-named queue per worker, bound to a
+    topic exchange with a routing key per room that has local sockets
+    """
+
+    name = "rabbitmq"
+
+    def __init__(self, handler: MessageHandler):
+        super().__init__(handler)
+        self.channel: aio_pika.abc.AbstractChannel | None = None
+        self.exchange: aio_pika.abc.AbstractExchange | None = None
+        self.queue: aio_pika.abc.AbstractQueue | None = None
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def routing_key(room_id: str) -> str:
+        return f"room.{room_id}"
+
+    async def ensure(self):
+        """
+        declare the worker's channel, topic exchange and exclusive queue once.
+        connect_robust restores the channel, queue and its bindings after a
+        broker reconnect, so this only has to run on first use.
+        """
+        async with self.lock:
+            if self.channel is not None and not self.channel.is_closed:
+                return
+
+            connection = await get_rabbit_connection()
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=RealtimeConfig.ROOM_PREFETCH)
+            exchange = await channel.declare_exchange(
+                RealtimeConfig.ROOM_EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True
+            )
+            # server-named, exclusive: the queue lives and dies with this worker
+            queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+            await queue.consume(self.on_message)
+
+            self.channel = channel
+            self.exchange = exchange
+            self.queue = queue
+
+            # rebind rooms that already have local sockets (channel was lost)
+            for room_id in self.rooms:
+                await queue.bind(exchange, routing_key=self.routing_key(room_id))
+
+            print(f"Declared shared queue {queue.name} on {exchange.name}\n")
+
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        async with message.process():
+            try:
+                payload = json.loads(message.body.decode())
+            except ValueError as e:
+                print(f"Dropping undecodable message on {message.routing_key}: {e}\n")
+                return
+            await self.dispatch(payload)
+
+    async def subscribe(self, room_id: str):
+        await self.ensure()
+        self.rooms.add(room_id)
+        await self.queue.bind(self.exchange, routing_key=self.routing_key(room_id))
+        print(f"Bound room {room_id} to {self.queue.name}\n")
+
+    async def unsubscribe(self, room_id: str):
+        self.rooms.discard(room_id)
+        if self.queue is None:
+            return
+        await self.queue.unbind(self.exchange, routing_key=self.routing_key(room_id))
+
+    async def publish(self, room_id: str, message: Dict[str, Any]):
+        await self.ensure()
+        await self.exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(message).encode(),
+                content_type="application/json",
+            ),
+            routing_key=self.routing_key(room_id),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            **super().describe(),
+            "queue": self.queue.name if self.queue is not None else None,
+        }
+
+
+class RedisStreamsBus(MessageBus):
+    """
+    a capped stream per room (bus:room:{room_id}); each worker runs a single
+    reader that XREADs every stream it is subscribed to. a subscription
+    starts at the stream's current last id, so messages published while the
+    reader is still blocked on the previous set of streams are not lost,
+    they are picked up by the next read (at most block_ms later).
+    every publish also renews the stream's ttl, so the streams of rooms that
+    went quiet expire instead of staying in redis for good.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        maxlen: int = RealtimeConfig.BUS_STREAM_MAXLEN,
+        block_ms: int = RealtimeConfig.BUS_STREAM_BLOCK_MS,
+        ttl: int = RealtimeConfig.BUS_STREAM_TTL,
+    ):
+        super().__init__(handler)
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.block_ms = block_ms
+        self.redis_client = redis.Redis().from_url(
+            url=RealtimeConfig.REDIS_URL, decode_responses=True, db=0
+        )
+        self.last_ids: Dict[str, str] = {}
+        self.reader_task: asyncio.Task | None = None
+
+    @staticmethod
+    def stream_key(room_id: str) -> str:
+        return f"bus:room:{room_id}"
+
+    async def subscribe(self, room_id: str):
+        latest = await self.redis_client.xrevrange(self.stream_key(room_id), count=1)
+        self.last_ids[self.stream_key(room_id)] = latest[0][0] if latest else "0-0"
+        self.rooms.add(room_id)
+        if self.reader_task is None or self.reader_task.done():
+            self.reader_task = asyncio.create_task(self.read())
+
+    async def unsubscribe(self, room_id: str):
+        self.rooms.discard(room_id)
+        self.last_ids.pop(self.stream_key(room_id), None)
+
+    async def publish(self, room_id: str, message: Dict[str, Any]):
+        stream_key = self.stream_key(room_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                stream_key,
+                {"data": json.dumps(message)},
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+            pipe.expire(stream_key, self.ttl)
+            await pipe.execute()
+
+    async def read(self):
+        while self.last_ids:
+            try:
+                batches = await self.redis_client.xread(
+                    dict(self.last_ids), block=self.block_ms
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Redis bus read failed: {e}\n")
+                await asyncio.sleep(1)
+                continue
+            for stream, entries in batches or ():
+                if stream not in self.last_ids:
+                    continue  # unsubscribed while the read was in flight
+                for entry_id, fields in entries:
+                    self.last_ids[stream] = entry_id
+                    try:
+                        payload = json.loads(fields["data"])
+                    except (KeyError, ValueError) as e:
+                        print(f"Dropping undecodable entry {entry_id}: {e}\n")
+                        continue
+                    await self.dispatch(payload)
+
+
+BUS_BACKENDS = {
+    InProcessBus.name: InProcessBus,
+    RabbitMQBus.name: RabbitMQBus,
+    RedisStreamsBus.name: RedisStreamsBus,
+}
+
+
+def create_message_bus(
+    handler: MessageHandler, backend: str = RealtimeConfig.MESSAGE_BUS
+) -> MessageBus:
+    try:
+        return BUS_BACKENDS[backend](handler)
+    except KeyError:
+        raise ValueError(
+            f"unknown MESSAGE_BUS {backend!r}, expected one of {sorted(BUS_BACKENDS)}"
+        ) from None
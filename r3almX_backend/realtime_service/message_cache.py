@@ -0,0 +1,72 @@
+import json
+from typing import Any, Dict, Iterable, List
+
+import redis.asyncio as redis
+
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+
+# fill a cold channel cache in one round trip, unless live messages got there
+# first (their order would otherwise be broken by the older history)
+WARM_STREAM = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+for i = 2, #ARGV do
+    redis.call('xadd', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'data', ARGV[i])
+end
+return #ARGV - 1
+"""
+
+
+class MessageCache:
+    """
+    the recent messages of each channel, kept in a capped redis stream
+    (room:{room_id}:channel:{channel_id}:recent). appends are a single XADD
+    with an approximate MAXLEN, reads are one XREVRANGE, newest first.
+    """
+
+    def __init__(self, size: int = RealtimeConfig.MESSAGE_CACHE_SIZE):
+        self.size = size
+        self.redis_client = redis.Redis().from_url(
+            url=RealtimeConfig.REDIS_URL, decode_responses=True, db=1
+        )
+
+    @staticmethod
+    def key(room_id: str, channel_id: str) -> str:
+        return f"room:{room_id}:channel:{channel_id}:recent"
+
+    async def append(self, room_id: str, channel_id: str, message: Dict[str, Any]):
+        return await self.redis_client.xadd(
+            self.key(room_id, channel_id),
+            {"data": json.dumps(message, default=str)},
+            maxlen=self.size,
+            approximate=True,
+        )
+
+    async def recent(self, room_id: str, channel_id: str) -> List[Dict[str, Any]]:
+        """the cached messages of a channel, newest first"""
+        entries = await self.redis_client.xrevrange(
+            self.key(room_id, channel_id), count=self.size
+        )
+        return [json.loads(fields["data"]) for _, fields in entries]
+
+    async def warm(
+        self, room_id: str, channel_id: str, messages: Iterable[Dict[str, Any]]
+    ) -> int:
+        """messages oldest first; returns how many were written (0 if not cold)"""
+        payloads = [json.dumps(message, default=str) for message in messages]
+        if not payloads:
+            return 0
+        return await self.redis_client.eval(
+            WARM_STREAM, 1, self.key(room_id, channel_id), self.size, *payloads
+        )
+
+    async def clear(self, room_id: str, channel_id: str):
+        # :messages is the list the cache used to live in
+        await self.redis_client.delete(
+            self.key(room_id, channel_id),
+            f"room:{room_id}:channel:{channel_id}:messages",
+        )
+
+
+message_cache = MessageCache()
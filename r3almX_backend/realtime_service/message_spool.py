@@ -0,0 +1,244 @@
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import uuid
+from typing import Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # windows dev boxes, spool files are not shared there
+    fcntl = None
+
+
+class MessageSpool:
+    """
+    append-only write-ahead log for messages waiting in the DigestionBroker.
+
+    every accepted message is written as a "put" record and fsync'd before
+    append() returns; flushed messages are marked with "ack" records. appends
+    that arrive close together share one write + fsync (group commit), so the
+    cost per message stays small even with large batches.
+
+    each worker owns one segment file in the spool directory, held with an
+    exclusive flock. on startup, segments nobody holds belong to dead workers
+    and their unacked messages are replayed.
+
+    messages the broker gives up on are appended to dead-letter.log in the
+    same directory and acked, so they are kept but never replayed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sync_interval: float = 0.005,
+        compact_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.directory = pathlib.Path(directory)
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.path = self.directory / f"digestion-{os.getpid()}-{uuid.uuid4().hex[:8]}.log"
+        self.file = None
+        self.pending: Dict[str, dict] = {}  # id -> record not yet acked
+        self.buffer: List[bytes] = []
+        # (message id, future) of every put in the buffer
+        self.waiters: List[Tuple[str, asyncio.Future]] = []
+        self.sync_handle: asyncio.TimerHandle | None = None
+        self.write_lock = asyncio.Lock()
+
+    def open(self):
+        """
+        the segment is created and locked under a name recover() does not
+        look at, and only then renamed into place, so another worker can
+        never see it unlocked and take it for a dead one
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".opening")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(tmp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self.file = os.fdopen(fd, "ab")
+
+    @staticmethod
+    def encode(record: dict) -> bytes:
+        return json.dumps(record, default=str, separators=(",", ":")).encode() + b"\n"
+
+    @staticmethod
+    def decode_message(msg: dict) -> dict:
+        if isinstance(msg.get("timestamp"), str):
+            msg["timestamp"] = datetime.datetime.fromisoformat(msg["timestamp"])
+        return msg
+
+    async def append(self, msg: dict):
+        """returns once the message is durable on disk"""
+        if self.file is None:
+            self.open()
+        self.pending[msg["id"]] = msg
+        future = asyncio.get_running_loop().create_future()
+        self.buffer.append(self.encode({"op": "put", "msg": msg}))
+        self.waiters.append((msg["id"], future))
+        if self.sync_handle is None:
+            self.sync_handle = asyncio.get_running_loop().call_later(
+                self.sync_interval, lambda: asyncio.create_task(self.sync())
+            )
+        await future
+
+    async def ack(self, message_ids: List[str]):
+        if not message_ids or self.file is None:
+            return
+        for message_id in message_ids:
+            self.pending.pop(message_id, None)
+        # an ack lost in a crash only means an idempotent re-insert on replay,
+        # so it rides along with the next group commit instead of forcing one
+        self.buffer.append(self.encode({"op": "ack", "ids": message_ids}))
+        if self.sync_handle is None:
+            self.sync_handle = asyncio.get_running_loop().call_later(
+                self.sync_interval, lambda: asyncio.create_task(self.sync())
+            )
+
+    async def sync(self):
+        async with self.write_lock:
+            self.sync_handle = None
+            buffer, self.buffer = self.buffer, []
+            waiters, self.waiters = self.waiters, []
+            if not buffer:
+                return
+            try:
+                await asyncio.to_thread(self.write_and_fsync, b"".join(buffer))
+            except Exception as e:
+                # the senders are told these were not stored, so they must
+                # not come back through compaction or a replay either
+                failed_ids = [message_id for message_id, _ in waiters]
+                for message_id in failed_ids:
+                    self.pending.pop(message_id, None)
+                if failed_ids:
+                    self.buffer.append(self.encode({"op": "ack", "ids": failed_ids}))
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for _, future in waiters:
+                if not future.done():
+                    future.set_result(None)
+
+            if not self.pending and not self.buffer:
+                await asyncio.to_thread(self.truncate)
+            elif self.file.tell() > self.compact_bytes:
+                await asyncio.to_thread(self.compact)
+
+    def write_and_fsync(self, data: bytes):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        # everything written so far is acked, start the segment over
+        self.file.truncate(0)
+        self.file.seek(0)
+        os.fsync(self.file.fileno())
+
+    def compact(self):
+        """rewrite the segment with only the unacked puts"""
+        tmp_path = self.path.with_suffix(".compact")
+        with open(tmp_path, "wb") as tmp:
+            for msg in list(self.pending.values()):
+                tmp.write(self.encode({"op": "put", "msg": msg}))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        new_file = open(tmp_path, "ab")
+        if fcntl is not None:
+            fcntl.flock(new_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp_path, self.path)
+        self.file.close()
+        self.file = new_file
+
+    def claim_dead_segments(self) -> List[tuple]:
+        """
+        lock every segment no live worker holds and read its unacked puts.
+        returns (path, locked file, messages); the files stay open, and so
+        locked, until release_segment(). file i/o only, runs in a thread.
+        """
+        claimed = []
+        for segment in sorted(self.directory.glob("digestion-*.log")):
+            if segment == self.path:
+                continue
+            try:
+                f = open(segment, "rb")
+            except FileNotFoundError:
+                continue  # recovered by another worker meanwhile
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    f.close()
+                    continue  # a live worker owns this segment
+            unacked: Dict[str, dict] = {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail of a crashed segment
+                if record["op"] == "put":
+                    unacked[record["msg"]["id"]] = record["msg"]
+                elif record["op"] == "ack":
+                    for message_id in record["ids"]:
+                        unacked.pop(message_id, None)
+            claimed.append((segment, f, list(unacked.values())))
+        return claimed
+
+    def write_dead_letters(self, data: bytes):
+        with open(self.directory / "dead-letter.log", "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def dead_letter(self, messages: List[dict]):
+        """keep messages that will never be stored, and stop replaying them"""
+        data = b"".join(self.encode({"op": "dead", "msg": msg}) for msg in messages)
+        await asyncio.to_thread(self.write_dead_letters, data)
+        await self.ack([msg["id"] for msg in messages])
+
+    @staticmethod
+    def release_segment(segment: pathlib.Path, f):
+        segment.unlink(missing_ok=True)
+        f.close()
+
+    async def recover(self) -> List[dict]:
+        """
+        collect unacked messages from segments left behind by dead workers.
+        the recovered messages are re-spooled into this worker's segment
+        before the old files are removed, so a crash mid-recovery loses
+        nothing; duplicates are collapsed by message id. file i/o happens in
+        a thread, self.pending is only touched here on the loop.
+        """
+        if self.file is None:
+            self.open()
+
+        recovered: List[dict] = []
+        for segment, f, unacked in await asyncio.to_thread(self.claim_dead_segments):
+            messages = [
+                self.decode_message(msg)
+                for msg in unacked
+                if msg["id"] not in self.pending
+            ]
+            for msg in messages:
+                self.pending[msg["id"]] = msg
+            if messages:
+                # same lock as the group commit, the two never interleave
+                async with self.write_lock:
+                    await asyncio.to_thread(
+                        self.write_and_fsync,
+                        b"".join(self.encode({"op": "put", "msg": m}) for m in messages),
+                    )
+            await asyncio.to_thread(self.release_segment, segment, f)
+            recovered.extend(messages)
+
+        print(f"Recovered {len(recovered)} spooled messages\n")
+        return recovered
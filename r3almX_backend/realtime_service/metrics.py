@@ -0,0 +1,167 @@
+import bisect
+from typing import Callable, Dict, List, Sequence
+
+# seconds, from sub-millisecond socket writes up to slow database flushes
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float] | None = None):
+        self.name = name
+        self.help = help
+        # read at scrape time instead of being kept up to date
+        self.fn = fn
+        self.value = 0.0
+
+    def samples(self) -> List[str]:
+        value = self.fn() if self.fn is not None else self.value
+        return [f"{self.name} {format_value(value)}"]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{{le="{format_value(bound)}"}} {cumulative}'
+            )
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {format_value(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    the metrics of this worker. series are fixed at registration (no per-room
+    labels) so a scrape costs the same no matter how many rooms or sockets
+    the worker holds.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, help: str, fn: Callable[[], float] | None = None
+    ) -> Counter:
+        return self.register(Counter(name, help, fn))
+
+    def gauge(
+        self, name: str, help: str, fn: Callable[[], float] | None = None
+    ) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        """prometheus text exposition format 0.0.4"""
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"metric {metric.name} failed to render: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+messages_in = registry.counter(
+    "r3almx_messages_in_total", "chat messages accepted from websockets"
+)
+messages_out = registry.counter(
+    "r3almx_messages_out_total", "chat frames queued for delivery to websockets"
+)
+fanout_latency = registry.histogram(
+    "r3almx_fanout_latency_seconds", "time from fan-out enqueue to socket write"
+)
+fanout_evicted = registry.counter(
+    "r3almx_fanout_evicted_total", "lagging sockets disconnected by the fan-out"
+)
+fanout_dropped = registry.counter(
+    "r3almx_fanout_dropped_total", "frames dropped from lagging sockets' backlogs"
+)
+digest_batch_size = registry.histogram(
+    "r3almx_digest_batch_size", "messages per DigestionBroker flush", SIZE_BUCKETS
+)
+digest_flush_seconds = registry.histogram(
+    "r3almx_digest_flush_seconds", "duration of DigestionBroker flushes"
+)
+digest_failed = registry.counter(
+    "r3almx_digest_failed_total", "messages that failed to write and were requeued"
+)
@@ -1,11 +1,14 @@
 import asyncio
 import hashlib
 import json
-from typing import Dict, Union, overload
+import time
+from typing import Any, Dict, Tuple, Union, overload
 
 import aio_pika
 from fastapi import Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 
+from r3almX_backend.auth_service.token_auth import token_authenticator
 from r3almX_backend.auth_service.user_handler_utils import get_db
 from r3almX_backend.auth_service.user_models import User
 from r3almX_backend.realtime_service.chat_service import (
@@ -13,26 +16,24 @@ from r3almX_backend.realtime_service.chat_service import (
     get_user_from_token,
     room_manager,
 )
+from r3almX_backend.realtime_service.connection_service import (
+    connection_manager,
+    presence_hub,
+)
 from r3almX_backend.realtime_service.main import realtime
+from r3almX_backend.realtime_service.metrics import registry
 
 
 class Observer:
     """metrics and state of the room's live service"""
 
-    def __init__(self, room_inst: RoomManager):
+    def __init__(self, room_inst: RoomManager, interval: float = 1.0):
         self.room_inst = room_inst
-
-        self.rooms_hash: str = self.gen_hash(self.serialize(self.room_inst.rooms))
-
-        self.rabbit_queues_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.rabbit_queues)
-        )
-        self.rabbit_channels_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.rabbit_channels)
-        )
-        self.broadcast_tasks_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.broadcast_tasks)
-        )
+        self.interval = interval
+        # part -> key -> (hash, value), taken once per interval and shared by
+        # every /logs subscriber
+        self.snapshot: Dict[str, Dict[str, Tuple[str, Any]]] = {}
+        self.taken_at = float("-inf")
 
     def gen_hash(self, dictionary):
         try:
@@ -123,66 +124,118 @@ class Observer:
                 for key, task in dict.items()
             }
 
-    def update_check(self):
-
-        _rooms_hash: str = self.gen_hash(self.serialize(self.room_inst.rooms))
-
-        _rabbit_queues_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.rabbit_queues)
-        )
-
-        _rabbit_channels_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.rabbit_channels)
-        )
-
-        _broadcast_tasks_hash: str = self.gen_hash(
-            self.serialize(self.room_inst.broadcast_tasks)
-        )
-
-        # individual if statements to update parts which need to updated
-        # instead of waiting for every single piece of information to update
-
-        if _rooms_hash == self.rooms_hash:
-            self.rooms_hash = _rooms_hash
-
-        if _rabbit_queues_hash == self.rabbit_queues_hash:
-            self.rabbit_queues_hash = _rabbit_queues_hash
-
-        if _rabbit_channels_hash == self.rabbit_channels_hash:
-            self.rabbit_channels_hash = _rabbit_channels_hash
-
-        if _broadcast_tasks_hash == self.broadcast_tasks_hash:
-            self.broadcast_tasks_hash = _broadcast_tasks_hash
+    def take_snapshot(self) -> Dict[str, Dict[str, Tuple[str, Any]]]:
+        """send() with every key hashed, recomputed at most once per interval"""
+        now = time.monotonic()
+        if now - self.taken_at >= self.interval:
+            self.snapshot = {
+                part: {
+                    key: (self.gen_hash(value), value) for key, value in state.items()
+                }
+                for part, state in self.send().items()
+            }
+            self.taken_at = now
+        return self.snapshot
+
+    def update_check(self, hashes: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+        """
+        per part, the keys that changed or appeared since the last check
+        against hashes (each /logs subscriber keeps its own) and the keys that
+        went away. a room with one new socket costs that room, not all of them
+        """
+        delta = {}
+        for part, entries in self.take_snapshot().items():
+            seen = hashes.setdefault(part, {})
+            changed = {
+                key: value
+                for key, (key_hash, value) in entries.items()
+                if seen.get(key) != key_hash
+            }
+            removed = [key for key in seen if key not in entries]
+            for key in removed:
+                del seen[key]
+            for key in changed:
+                seen[key] = entries[key][0]
+            if changed or removed:
+                delta[part] = {"changed": changed, "removed": removed}
+        return delta
 
     def send(self):
 
         return {
-            "rooms": self.serialize(self.room_inst.rooms),
-            "rabbit_queues": self.serialize(self.room_inst.rabbit_queues),
-            "rabbit_channels": self.serialize(self.room_inst.rabbit_channels),
-            "broadcast_tasks": self.serialize(self.room_inst.broadcast_tasks),
+            "rooms": self.serialize(self.room_inst.rooms) or {},
+            "bus": self.room_inst.bus.describe(),
+            "fanout": self.room_inst.fanout.stats(),
         }
 
 
 observer = Observer(room_inst=room_manager)
 
+registry.gauge(
+    "r3almx_active_rooms",
+    "rooms with at least one local socket",
+    fn=lambda: len(room_manager.rooms),
+)
+registry.gauge(
+    "r3almx_room_sockets",
+    "chat sockets with a fan-out outbox",
+    fn=lambda: len(room_manager.fanout.outboxes),
+)
+registry.gauge(
+    "r3almx_connection_sockets",
+    "/connection sockets held by this worker",
+    fn=lambda: len(connection_manager.connection_sockets),
+)
+registry.gauge(
+    "r3almx_presence_subscribers",
+    "sockets subscribed to presence changes",
+    fn=lambda: len(presence_hub.subscribers),
+)
+registry.counter(
+    "r3almx_token_cache_hits_total",
+    "bearer tokens verified from the token cache",
+    fn=lambda: token_authenticator.hits,
+)
+registry.counter(
+    "r3almx_token_cache_misses_total",
+    "bearer tokens that needed a full jwt decode",
+    fn=lambda: token_authenticator.misses,
+)
+
 """
  - username: oddyseys
  - password: password
 """
 
 
+@realtime.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @realtime.websocket("/logs")
 async def logs_endpoint(websocket: WebSocket, token: str, db=Depends(get_db)):
-    user: User | str = await get_user_from_token(token, db)
-    print(user)
+    user: User | None = await get_user_from_token(token, db)
+    if user is None:
+        return await websocket.close(1001)
 
     await websocket.accept()
+    # first frame is the full state, after that per part the changed keys
+    # and the removed ones
+    hashes: Dict[str, Dict[str, str]] = {}
+    first = True
     while True:
         try:
-            await websocket.send_json(observer.send())
-            await asyncio.sleep(1)  # Add delay to prevent spam
-
-        except WebSocketDisconnect:
+            delta = observer.update_check(hashes)
+            if first:
+                parts = {part: value["changed"] for part, value in delta.items()}
+                await websocket.send_json({"type": "snapshot", **parts})
+                first = False
+            elif delta:
+                await websocket.send_json({"type": "delta", **delta})
+            await asyncio.sleep(observer.interval)  # Add delay to prevent spam
+
+        except (WebSocketDisconnect, RuntimeError):
             break
-    await WebSocket.close()
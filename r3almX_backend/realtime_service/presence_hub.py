@@ -0,0 +1,114 @@
+import asyncio
+import json
+from typing import Dict, Iterable, Set
+
+from fastapi import WebSocket
+
+from r3almX_backend.realtime_service.Config import RealtimeConfig
+
+PRESENCE_CHANNEL = "presence:changes"
+MAX_WATCHED_USERS = 1000
+
+
+class PresenceSubscriber:
+    """one websocket's watch list and the statuses it was last sent"""
+
+    __slots__ = ("websocket", "known")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.known: Dict[str, str] = {}
+
+
+class PresenceHub:
+    """
+    streams presence changes to websocket subscribers on this worker.
+
+    Connection publishes every explicit status change on PRESENCE_CHANNEL;
+    the hub holds one pub/sub subscription per worker and forwards each change
+    only to the sockets watching that user. expiry of a presence key does not
+    publish anything, so a periodic resync re-reads every watched user in one
+    MGET and pushes whatever drifted.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.subscribers: Dict[WebSocket, PresenceSubscriber] = {}
+        self.watchers: Dict[str, Set[PresenceSubscriber]] = {}
+        self.listener_task: asyncio.Task | None = None
+        self.resync_task: asyncio.Task | None = None
+
+    async def subscribe(self, websocket: WebSocket, user_ids: Iterable[str]) -> Dict[str, str]:
+        """(re)set the watch list of a socket, returns the current snapshot"""
+        self.unsubscribe(websocket)
+        subscriber = PresenceSubscriber(websocket)
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        subscriber.known = await self.connection.get_status_cache(
+            user_ids[:MAX_WATCHED_USERS]
+        )
+        self.subscribers[websocket] = subscriber
+        for user_id in subscriber.known:
+            self.watchers.setdefault(user_id, set()).add(subscriber)
+        self.start()
+        return dict(subscriber.known)
+
+    def unsubscribe(self, websocket: WebSocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        for user_id in subscriber.known:
+            watching = self.watchers.get(user_id)
+            if watching is not None:
+                watching.discard(subscriber)
+                if not watching:
+                    del self.watchers[user_id]
+
+    def start(self):
+        if self.listener_task is None or self.listener_task.done():
+            self.listener_task = asyncio.create_task(self.listen())
+        if self.resync_task is None or self.resync_task.done():
+            self.resync_task = asyncio.create_task(self.resync())
+
+    async def listen(self):
+        pubsub = self.connection.redis_client.pubsub()
+        await pubsub.subscribe(PRESENCE_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                await self.dispatch(json.loads(message["data"]))
+        except Exception as e:
+            print(f"presence listener stopped: {e}")
+        finally:
+            await pubsub.aclose()
+
+    async def resync(self):
+        while self.subscribers:
+            await asyncio.sleep(RealtimeConfig.PRESENCE_HEARTBEAT)
+            try:
+                await self.dispatch(
+                    await self.connection.get_status_cache(tuple(self.watchers))
+                )
+            except Exception as e:
+                print(f"presence resync failed: {e}")
+
+    async def dispatch(self, changes: Dict[str, str]):
+        diffs: Dict[PresenceSubscriber, Dict[str, str]] = {}
+        for user_id, status in changes.items():
+            for subscriber in self.watchers.get(user_id, ()):
+                if subscriber.known.get(user_id) != status:
+                    subscriber.known[user_id] = status
+                    diffs.setdefault(subscriber, {})[user_id] = status
+        if diffs:
+            await asyncio.gather(
+                *(self.push(subscriber, diff) for subscriber, diff in diffs.items())
+            )
+
+    async def push(self, subscriber: PresenceSubscriber, diff: Dict[str, str]):
+        try:
+            await subscriber.websocket.send_json(
+                {"type": "PRESENCE_DIFF", "presence": diff}
+            )
+        except Exception as e:
+            print(f"presence push failed: {e}")
+            self.unsubscribe(subscriber.websocket)
@@ -0,0 +1,15 @@
+# Constants for the search service, overridable through the .env file.
+from typing import Final
+
+from dotenv import dotenv_values
+
+
+class SearchConfig(object):
+    config = dotenv_values(".env")
+    REDIS_URL: Final = config.get("REDIS_URL", "redis://redis:6379")
+    # per-worker username prefix index, built at startup
+    PREFIX_INDEX_ENABLED: Final = config.get("PREFIX_INDEX_ENABLED", "1") == "1"
+    PREFIX_INDEX_BATCH: Final = int(config.get("PREFIX_INDEX_BATCH", 5000))
+    # seconds between attempts to resubscribe or rebuild, doubling up to the max
+    PREFIX_INDEX_RETRY_MIN: Final = float(config.get("PREFIX_INDEX_RETRY_MIN", 1))
+    PREFIX_INDEX_RETRY_MAX: Final = float(config.get("PREFIX_INDEX_RETRY_MAX", 60))
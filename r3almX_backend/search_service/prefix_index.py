@@ -0,0 +1,179 @@
+import asyncio
+import bisect
+import json
+from typing import Dict, List, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.database import SessionLocal
+from r3almX_backend.search_service.Config import SearchConfig
+
+USERNAME_CHANNEL = "usernames:changes"
+# sorts after every character a username can hold
+KEY_END = "\U0010ffff"
+
+
+class UsernameIndex:
+    """
+    per-worker typeahead over usernames: a sorted array of
+    "{casefolded username}\\0{user id}" keys, so a prefix is a bisect and a
+    short forward scan. profiles sit beside it in a dict keyed by id.
+
+    built at startup by streaming users in keyset batches, then kept current
+    by the usernames:changes pub/sub channel, which create_user_record and
+    assign_username publish to, so every worker sees renames and signups.
+    until a build finishes, ready is False and callers go to the db. when
+    the subscription drops, changes may have been missed, so ready goes back
+    to False and the index resubscribes and rebuilds, with backoff.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SearchConfig.PREFIX_INDEX_BATCH,
+        retry_min: float = SearchConfig.PREFIX_INDEX_RETRY_MIN,
+        retry_max: float = SearchConfig.PREFIX_INDEX_RETRY_MAX,
+    ):
+        self.batch_size = batch_size
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.keys: List[str] = []
+        self.profiles: Dict[str, Tuple[str, str, str | None]] = {}
+        self.ready = False
+        # changes received while the build is still streaming
+        self.pending: List[dict] | None = None
+        self.task: asyncio.Task | None = None
+        self.redis_client = redis.Redis().from_url(
+            url=SearchConfig.REDIS_URL, decode_responses=True, db=0
+        )
+
+    @staticmethod
+    def key(username: str, user_id: str) -> str:
+        return f"{username.casefold()}\0{user_id}"
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + KEY_END, lo=start)
+        results = []
+        for key in self.keys[start : min(end, start + limit)]:
+            user_id, username, pic = self.profiles[key.rsplit("\0", 1)[1]]
+            results.append({"id": user_id, "username": username, "pfp": pic})
+        return results
+
+    def upsert(self, user_id: str, username: str | None, pic: str | None = None):
+        self.remove(user_id)
+        if not username:
+            return
+        bisect.insort(self.keys, self.key(username, user_id))
+        self.profiles[user_id] = (user_id, username, pic)
+
+    def remove(self, user_id: str):
+        profile = self.profiles.pop(user_id, None)
+        if profile is None:
+            return
+        key = self.key(profile[1], user_id)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def apply(self, change: dict):
+        if self.pending is not None:
+            self.pending.append(change)
+            return
+        self.upsert(change["id"], change.get("username"), change.get("pic"))
+
+    async def build(self) -> bool:
+        self.pending = []
+        keys: List[str] = []
+        profiles: Dict[str, Tuple[str, str, str | None]] = {}
+        last_id = None
+        try:
+            async with SessionLocal() as db:
+                while True:
+                    query = (
+                        select(User.id, User.username, User.profile_pic)
+                        .order_by(User.id)
+                        .limit(self.batch_size)
+                    )
+                    if last_id is not None:
+                        query = query.where(User.id > last_id)
+                    rows = (await db.execute(query)).all()
+                    if not rows:
+                        break
+                    for row in rows:
+                        if row.username:
+                            user_id = str(row.id)
+                            keys.append(self.key(row.username, user_id))
+                            profiles[user_id] = (user_id, row.username, row.profile_pic)
+                    last_id = rows[-1].id
+        except Exception as e:
+            print(f"username index build failed: {e}")
+            self.pending = None
+            return False
+
+        keys.sort()
+        self.keys, self.profiles = keys, profiles
+        pending, self.pending = self.pending, None
+        for change in pending:
+            self.apply(change)
+        self.ready = True
+        print(f"username index built: {len(self.keys)} users\n")
+        return True
+
+    async def listen(self, pubsub):
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                self.apply(json.loads(message["data"]))
+        except Exception as e:
+            print(f"username index listener stopped: {e}")
+        finally:
+            await pubsub.aclose()
+
+    async def run(self):
+        """subscribe, build, and start over whenever the subscription drops"""
+        delay = self.retry_min
+        while True:
+            # subscribe before streaming, so nothing falls between the two
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(USERNAME_CHANNEL)
+            except Exception as e:
+                print(f"username index cannot subscribe, retrying in {delay}s: {e}")
+                await pubsub.aclose()
+            else:
+                listener = asyncio.create_task(self.listen(pubsub))
+                while not listener.done() and not await self.build():
+                    print(f"username index rebuild in {delay}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.retry_max)
+                if self.ready:
+                    delay = self.retry_min
+                await listener
+                # changes published from here on would be missed
+                self.ready = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+
+    async def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def publish(self, user: User):
+        change = {
+            "id": str(user.id),
+            "username": user.username,
+            "pic": user.profile_pic,
+        }
+        # this worker sees it right away, the others through the channel
+        self.apply(change)
+        try:
+            await self.redis_client.publish(USERNAME_CHANNEL, json.dumps(change))
+        except Exception as e:
+            print(f"username index publish failed: {e}")
+
+
+username_index = UsernameIndex()
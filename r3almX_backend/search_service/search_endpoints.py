@@ -1,37 +1,123 @@
+import asyncio
+from typing import Literal
+
 from fastapi import Depends, Query
-from sqlalchemy import text
+from sqlalchemy import Float, cast, func, select
 
 from r3almX_backend.auth_service.auth_utils import get_current_user
-from r3almX_backend.auth_service.user_handler_utils import get_db, get_user_by_username
-from r3almX_backend.auth_service.user_models import User
+from r3almX_backend.auth_service.user_handler_utils import get_db
+from r3almX_backend.auth_service.user_models import ENGLISH, User
 from r3almX_backend.database import AsyncSession
+from r3almX_backend.search_service.Config import SearchConfig
 from r3almX_backend.search_service.main import search_service
+from r3almX_backend.search_service.prefix_index import username_index
+
+SEARCH_LIMIT = 50
+PREFIX_LIMIT = 20
+
+SearchMode = Literal["trigram", "fts", "levenshtein"]
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def user_search_query(query: str, mode: SearchMode, limit: int):
+    """
+    ranked top-k users with their profile columns, in one statement.
+
+    trigram: username % query or a username prefix, both served by the
+    ix_users_username_trgm gin index; prefix matches rank first, then
+    similarity. fts: the idx_person_fts tsvector index, ranked by ts_rank.
+    levenshtein: the old edit distance <= 5, no index, scans every user.
+    """
+    columns = (User.id, User.username, User.profile_pic)
+    if mode == "trigram":
+        prefix = User.username.ilike(escape_like(query) + "%", escape="\\")
+        score = func.similarity(User.username, query)
+        return (
+            select(*columns, score.label("score"))
+            .where(User.username.op("%")(query) | prefix)
+            .order_by(prefix.desc(), score.desc(), User.username)
+            .limit(limit)
+        )
+    if mode == "fts":
+        # must match the idx_person_fts expression for the index to be used
+        tsquery = func.plainto_tsquery(ENGLISH, query)
+        score = func.ts_rank(User.__ts_vector__, tsquery)
+        return (
+            select(*columns, score.label("score"))
+            .where(User.__ts_vector__.op("@@")(tsquery))
+            .order_by(score.desc(), User.username)
+            .limit(limit)
+        )
+    distance = func.levenshtein(User.username, query)
+    return (
+        select(*columns, cast(distance, Float).label("score"))
+        .where(distance <= 5)
+        .order_by(distance, User.username)
+        .limit(limit)
+    )
 
 
 @search_service.get("/friends")
 async def get_friends(
     query: str,
+    mode: SearchMode = "trigram",
+    limit: int = Query(5, ge=1, le=SEARCH_LIMIT),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    sql = text(
-        """
-        SELECT username, levenshtein(username, :query) AS distance
-        FROM users
-        WHERE levenshtein(username, :query) <= 5
-        ORDER BY distance
-        """
-    )
-    result = await db.execute(sql, {"query": query})
-    user_found = result.fetchall()[0:5]
+    rows = await db.execute(user_search_query(query, mode, limit))
+    return {
+        "status": 200,
+        "results": [
+            {
+                "id": row.id,
+                "username": row.username,
+                "pfp": row.profile_pic,
+                "score": row.score,
+            }
+            for row in rows
+        ],
+    }
+
+
+@search_service.on_event("startup")
+async def build_username_index():
+    if SearchConfig.PREFIX_INDEX_ENABLED:
+        # in the background, searches use the db until it is ready
+        asyncio.create_task(username_index.start())
+
 
-    results = [await get_user_by_username(db, username[0]) for username in user_found]
+@search_service.get("/users/prefix")
+async def search_users_prefix(
+    query: str = Query(min_length=1),
+    limit: int = Query(10, ge=1, le=PREFIX_LIMIT),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if username_index.ready:
+        return {
+            "status": 200,
+            "results": username_index.search(query, limit),
+            "source": "memory",
+        }
+
+    # served by ix_users_username_trgm as well
+    rows = await db.execute(
+        select(User.id, User.username, User.profile_pic)
+        .where(User.username.ilike(escape_like(query) + "%", escape="\\"))
+        .order_by(func.lower(User.username), User.id)
+        .limit(limit)
+    )
     return {
         "status": 200,
-        "results": (
-            {"id": user.id, "username": user.username, "pfp": user.profile_pic}
-            for user in results
-        ),
+        "results": [
+            {"id": str(row.id), "username": row.username, "pfp": row.profile_pic}
+            for row in rows
+        ],
+        "source": "db",
     }
 
 